@@ -1,6 +1,59 @@
-import itertools
+import array
+import collections
+import functools
+import math
 import random
 
+import numpy as np
+
+
+# Largest number of partial assignment states kept for one cell while
+# counting the assignments of a frontier component. Cells of components
+# needing more get the highest count / size ratio of the sentences
+# containing them as their mine probability.
+MAX_COMPONENT_STATES = 20000
+
+
+class BoardGeometry():
+    """
+    Neighbours of every cell of a board of one size, computed once and
+    shared by every game and AI on boards of that size.
+
+    The neighbours are stored as flat cell indices i * width + j, eight
+    slots per cell padded with -1, so that the table of a 1000 x 1000 board
+    is one 32 MB array rather than millions of tuples.
+    """
+
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.table = array.array("i", [-1]) * (8 * height * width)
+        for i in range(height):
+            for j in range(width):
+                slot = 8 * (i * width + j)
+                for di in (-1, 0, 1):
+                    for dj in (-1, 0, 1):
+                        if (di or dj) and 0 <= i + di < height and 0 <= j + dj < width:
+                            self.table[slot] = (i + di) * width + j + dj
+                            slot += 1
+
+    def neighbours(self, cell):
+        """
+        Returns the cells next to `cell`, not including the cell itself.
+        """
+        slot = 8 * (cell[0] * self.width + cell[1])
+        width = self.width
+        return [divmod(index, width)
+                for index in self.table[slot:slot + 8] if index >= 0]
+
+
+@functools.lru_cache(maxsize=16)
+def board_geometry(height, width):
+    """
+    Returns the BoardGeometry of boards of the given size.
+    """
+    return BoardGeometry(height, width)
+
 
 class Minesweeper():
     """
@@ -30,6 +83,13 @@ class Minesweeper():
                 self.mines.add((i, j))
                 self.board[i][j] = True
 
+        # Count the mines next to every cell once
+        self.geometry = board_geometry(height, width)
+        self.counts = [[0] * self.width for _ in range(self.height)]
+        for mine in self.mines:
+            for i, j in self.geometry.neighbours(mine):
+                self.counts[i][j] += 1
+
         # At first, player has found no mines
         self.mines_found = set()
 
@@ -58,30 +118,72 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
+        return self.counts[cell[0]][cell[1]]
+
+    def won(self):
+        """
+        Checks if all mines have been flagged.
+        """
+        return self.mines_found == self.mines
 
-        # Keep count of nearby mines
-        count = 0
 
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
+class ArrayMinesweeper(Minesweeper):
+    """
+    Minesweeper game representation backed by NumPy arrays, for generating
+    many boards quickly. The mines are one sample of distinct cells drawn
+    from `rng`, a numpy.random.Generator, and the number of mines next to
+    every cell is computed at construction by summing the eight shifted
+    copies of the padded mine grid, a 3 x 3 convolution without the centre.
+    """
 
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
+    def __init__(self, height=8, width=8, mines=8, rng=None):
 
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
+        # Set initial width, height, and number of mines
+        self.height = height
+        self.width = width
+        self.mine_count = mines
+        rng = rng if rng is not None else np.random.default_rng()
+
+        # Place all mines at once on distinct cells
+        self.board = np.zeros(height * width, dtype=bool)
+        self.board[rng.choice(height * width, size=mines, replace=False)] = True
+        self.board = self.board.reshape(height, width)
+
+        # Count the mines next to every cell
+        padded = np.pad(self.board, 1).astype(np.uint8)
+        self.counts = np.zeros((height, width), dtype=np.uint8)
+        for di in range(3):
+            for dj in range(3):
+                if di != 1 or dj != 1:
+                    self.counts += padded[di:di + height, dj:dj + width]
+
+        # At first, player has found no mines
+        self.mines_found = set()
+
+    @functools.cached_property
+    def mines(self):
+        """
+        The set of cells with mines, built the first time it is needed.
+        """
+        return {(int(i), int(j)) for i, j in np.argwhere(self.board)}
 
-        return count
+    def is_mine(self, cell):
+        return bool(self.board[cell[0], cell[1]])
+
+    def nearby_mines(self, cell):
+        """
+        Returns the number of mines that are
+        within one row and column of a given cell,
+        not including the cell itself.
+        """
+        return int(self.counts[cell[0], cell[1]])
 
     def won(self):
         """
         Checks if all mines have been flagged.
         """
-        return self.mines_found == self.mines
+        return (len(self.mines_found) == self.mine_count
+                and all(self.board[i, j] for i, j in self.mines_found))
 
 
 class Sentence():
@@ -95,6 +197,12 @@ class Sentence():
         self.cells = set(cells)
         self.count = count
 
+    def __len__(self):
+        return len(self.cells)
+
+    def __iter__(self):
+        return iter(self.cells)
+
     def __eq__(self, other):
         return self.cells == other.cells and self.count == other.count
 
@@ -134,18 +242,334 @@ class Sentence():
         if cell in self.cells:
             self.cells.remove(cell)
 
+    def issubset(self, other):
+        """
+        Returns True if every cell of this sentence is in `other`.
+        """
+        return self.cells <= other.cells
+
+    def difference(self, other):
+        """
+        Returns the sentence about the cells of this sentence that are not
+        in `other`, given that `other` is a subset of it.
+        """
+        return Sentence(self.cells - other.cells, self.count - other.count)
+
+
+class BitSentence():
+    """
+    Logical statement about a Minesweeper game with the same interface as
+    Sentence, storing its cells as the bits of an integer. Cell (i, j) is
+    bit i * width + j - offset, where offset is the index of the first
+    cell, so a sentence about the neighbours of a cell takes at most
+    2 * width + 3 bits wherever it is on the board. Subset tests and
+    differences are a shift and a mask instead of set operations on
+    tuples. The number of cells is kept in `size` and the cells themselves
+    in `members`, decoded from the bits only for sentences made by
+    `from_bits`, so that the knowledge base can iterate over the cells and
+    test for empty sentences without decoding the bits every time.
+
+    BitSentence saves memory only; it is not a speed option. The knowledge
+    base is still keyed by (i, j) cells, so the bits are converted to and
+    from tuples at its boundary. On sentences of at most eight cells,
+    integer bit operations are no faster than set operations. Games with
+    `bitsets` run about 25% slower than with Sentence.
+    """
+
+    __slots__ = ("bits", "offset", "count", "width", "size", "members")
+
+    def __init__(self, cells, count, width):
+        # `cells` are distinct, like the set create_sentence builds
+        self.members = list(cells)
+        indices = [i * width + j for i, j in self.members]
+        offset = min(indices, default=0)
+        bits = 0
+        for index in indices:
+            bits |= 1 << (index - offset)
+        self.bits = bits
+        self.offset = offset
+        self.count = count
+        self.width = width
+        self.size = len(indices)
+
+    @classmethod
+    def from_bits(cls, bits, offset, count, width):
+        """
+        Returns the sentence about the cells of the set bits of `bits`,
+        counted from cell index `offset`.
+        """
+        sentence = cls.__new__(cls)
+        sentence.bits = bits
+        sentence.offset = offset
+        sentence.count = count
+        sentence.width = width
+        sentence.size = bin(bits).count("1")
+        sentence.members = None
+        sentence.normalize()
+        return sentence
+
+    @property
+    def cells(self):
+        """
+        The set of cells of the sentence. Iterating over the sentence
+        gives the same cells without building the set.
+        """
+        return set(self)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        if self.members is None:
+            members = []
+            bits = self.bits
+            while bits:
+                low = bits & -bits
+                members.append(divmod(self.offset + low.bit_length() - 1,
+                                      self.width))
+                bits ^= low
+            self.members = members
+        return iter(self.members)
+
+    def __eq__(self, other):
+        if isinstance(other, BitSentence) and other.width == self.width:
+            return (self.bits == other.bits and self.offset == other.offset
+                    and self.count == other.count)
+        return self.cells == other.cells and self.count == other.count
+
+    def __str__(self):
+        return f"{self.cells} = {self.count}"
+
+    def known_mines(self):
+        """
+        Returns the set of all cells in the sentence known to be mines.
+        """
+        if self.size == self.count:
+            return self.cells
+        return set()
+
+    def known_safes(self):
+        """
+        Returns the set of all cells in the sentence known to be safe.
+        """
+        if self.count == 0 and self.bits:
+            return self.cells
+        return set()
+
+    def mark_mine(self, cell):
+        """
+        Updates internal knowledge representation given the fact that
+        a cell is known to be a mine.
+        """
+        if self.remove(cell):
+            self.count = self.count - 1
+
+    def mark_safe(self, cell):
+        """
+        Updates internal knowledge representation given the fact that
+        a cell is known to be safe.
+        """
+        self.remove(cell)
+
+    def issubset(self, other):
+        """
+        Returns True if every cell of this sentence is in `other`.
+        """
+        if not (isinstance(other, BitSentence) and other.width == self.width):
+            return self.cells <= other.cells
+
+        # the first cell of a subset cannot come before the first cell of `other`
+        shift = self.offset - other.offset
+        if shift < 0:
+            return self.bits == 0
+        return (self.bits << shift) & ~other.bits == 0
+
+    def difference(self, other):
+        """
+        Returns the sentence about the cells of this sentence that are not
+        in `other`, given that `other` is a subset of it.
+        """
+        if not (isinstance(other, BitSentence) and other.width == self.width):
+            other = BitSentence(other.cells, other.count, self.width)
+        shift = other.offset - self.offset
+        if shift >= 0:
+            bits = self.bits & ~(other.bits << shift)
+        else:
+            bits = self.bits & ~(other.bits >> -shift)
+        return BitSentence.from_bits(bits, self.offset,
+                                     self.count - other.count, self.width)
+
+    def remove(self, cell):
+        """
+        Helper function that removes `cell` from the sentence.
+        Returns True if it was in the sentence.
+        """
+        index = cell[0] * self.width + cell[1] - self.offset
+        if index < 0 or not self.bits >> index & 1:
+            return False
+        self.bits ^= 1 << index
+        self.size -= 1
+        if self.members is not None:
+            self.members.remove(cell)
+
+        # only removing the first cell moves the offset
+        if index == 0:
+            self.normalize()
+        return True
+
+    def normalize(self):
+        """
+        Helper function that moves the offset to the first cell, so that
+        equal sentences have equal bits and offsets.
+        """
+        if self.bits:
+            low = (self.bits & -self.bits).bit_length() - 1
+            self.bits >>= low
+            self.offset += low
+        else:
+            self.offset = 0
+
+
+class KnowledgeBase():
+    """
+    Sentences known to be true, with an index from every cell to the
+    sentences containing it, so that marking a cell or looking for subsets
+    only touches the sentences sharing cells instead of all of them.
+    """
+
+    def __init__(self):
+
+        # Sentences by insertion number, and the number of every sentence
+        self.sentences = {}
+        self.keys = {}
+        self.next_key = 0
+
+        # Insertion numbers of the sentences containing each cell
+        self.cell_index = {}
+
+    def __len__(self):
+        return len(self.sentences)
+
+    def __iter__(self):
+        return iter(list(self.sentences.values()))
+
+    def __contains__(self, sentence):
+        return id(sentence) in self.keys
+
+    def add(self, sentence):
+        """
+        Adds a sentence unless it is empty or already known.
+        Returns True if it was added.
+        """
+        if len(sentence) == 0:
+            return False
+        cells = list(sentence)
+        if any(self.sentences[key] == sentence
+               for key in self.cell_index.get(cells[0], ())):
+            return False
+        key = self.next_key
+        self.next_key += 1
+        self.sentences[key] = sentence
+        self.keys[id(sentence)] = key
+        for cell in cells:
+            self.cell_index.setdefault(cell, set()).add(key)
+        return True
+
+    def remove(self, sentence):
+        """
+        Removes a sentence from the knowledge base if it is there.
+        """
+        key = self.keys.pop(id(sentence), None)
+        if key is None:
+            return
+        del self.sentences[key]
+        for cell in sentence:
+            self.unindex(cell, key)
+
+    def containing(self, cell):
+        """
+        Returns the sentences containing `cell`, oldest first.
+        """
+        return [self.sentences[key]
+                for key in sorted(self.cell_index.get(cell, ()))]
+
+    def overlapping(self, sentence):
+        """
+        Returns the other sentences sharing at least one cell with
+        `sentence`, oldest first. Only these can be its subsets or
+        supersets.
+        """
+        keys = set()
+        for cell in sentence:
+            keys.update(self.cell_index.get(cell, ()))
+        keys.discard(self.keys.get(id(sentence)))
+        return [self.sentences[key] for key in sorted(keys)]
+
+    def mark_mine(self, cell):
+        """
+        Marks `cell` as a mine in the sentences containing it.
+        Returns the sentences that changed.
+        """
+        return self.mark(cell, True)
+
+    def mark_safe(self, cell):
+        """
+        Marks `cell` as safe in the sentences containing it.
+        Returns the sentences that changed.
+        """
+        return self.mark(cell, False)
+
+    def mark(self, cell, mine):
+        """
+        Helper function that marks `cell` as a mine or as safe in the
+        sentences containing it, dropping any sentence left without cells.
+        """
+        changed = []
+        for key in sorted(self.cell_index.pop(cell, ())):
+            sentence = self.sentences[key]
+            if mine:
+                sentence.mark_mine(cell)
+            else:
+                sentence.mark_safe(cell)
+            if len(sentence) == 0:
+                del self.sentences[key]
+                del self.keys[id(sentence)]
+            changed.append(sentence)
+        return changed
+
+    def unindex(self, cell, key):
+        """
+        Helper function that removes a sentence number from the index of
+        `cell`.
+        """
+        keys = self.cell_index.get(cell)
+        if keys is not None:
+            keys.discard(key)
+            if len(keys) == 0:
+                del self.cell_index[cell]
+
 
 class MinesweeperAI():
     """
     Minesweeper game player
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, bitsets=False, total_mines=None):
 
         # Set initial height and width
         self.height = height
         self.width = width
 
+        # Number of mines on the board, if known, used to weigh mine probabilities
+        self.total_mines = total_mines
+
+        # Neighbours of every cell
+        self.geometry = board_geometry(height, width)
+
+        # Store new sentences as BitSentence instead of Sentence, which takes
+        # less memory per sentence but is slower
+        self.bitsets = bitsets
+
         # Keep track of which cells have been clicked on
         self.moves_made = set()
 
@@ -153,26 +577,26 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # Sentences about the game known to be true
+        self.knowledge = KnowledgeBase()
 
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
         to mark that cell as a mine as well.
+        Returns the sentences that changed.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+        return self.knowledge.mark_mine(cell)
 
     def mark_safe(self, cell):
         """
         Marks a cell as safe, and updates all knowledge
         to mark that cell as safe as well.
+        Returns the sentences that changed.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_safe(cell)
+        return self.knowledge.mark_safe(cell)
 
     def add_knowledge(self, cell, count):
         """
@@ -192,64 +616,64 @@ class MinesweeperAI():
         # 1. Add the cell to moves_made
         self.moves_made.add(cell)
 
-        # 2. Add the cell to safes
-        self.safes.add(cell)
+        # 2. Mark the cell safe. Sentences that contained it have changed and need another look
+        pending = collections.deque(self.mark_safe(cell))
 
         # 3. Create a sentence for the clicked cell with all the neighbor cells, and the count.
         sentence = self.create_sentence(cell, count)
-        if len(sentence.cells) != 0:
-            self.knowledge.append(sentence)
-
-        # flag for the loop. The flag is set to True so that we can continue to make inferences
-        # when there is any change in our ai knowledge
-        inference_flag = True
+        if self.knowledge.add(sentence):
+            pending.append(sentence)
 
         # 4 and 5 : Make inferences
-        while inference_flag:
-            # set to false. If any changes are made to our ai knowledge, it will be set to True and we will continue
-            # to make inferences in the while loop
-            inference_flag = False
-
-            # check 1st inference i.e. cells are mines. If yes mark them so they are removed from
-            # our sentences and added to mines
-            for sent in self.knowledge:
-                cells = sent.known_mines()
-                if len(cells) > 0:
-                    for cell in cells:
-                        self.mark_mine(cell)
-                        inference_flag = True
-
-            # check 2nd inference i.e. all cells are safe. If yes mark them so, they are marked safe and
-            # are removed from our knowledge and added to safes
-            for sent in self.knowledge:
-                if len(sent.cells) != 0:
-                    safe_cells = sent.known_safes()
-                    if len(safe_cells) > 0:
-                        for cell in safe_cells:
-                            self.mark_safe(cell)
-                            inference_flag = True
-
-            # check 3rd inference i.e. if a set is a subset of another set create additional knowledge for ai.
-
-            # remove any empty set. This creates unnecessary permutations for checking subsets,
-            # and needs to be pruned from the knowledge.
-            for sent in self.knowledge.copy():
-                if len(sent.cells) == 0:
-                    self.knowledge.remove(sent)
-
-            # loop through all the 2 permutations of sentence in the knowledge and check for a subset.
-            # If a subset is found add to our new knowledge.
-            # Once a new knowledge has been added break out of the loop to check if other inferences
-            # can be made on the new knowledge
-            if len(self.knowledge) >1:
-                for perm in itertools.permutations(self.knowledge.copy(), 2):
-                    if perm[0].cells.issubset(perm[1].cells):
-                        new_sent = Sentence(perm[1].cells - perm[0].cells, perm[1].count - perm[0].count)
-                        self.knowledge.append(new_sent)
-                        self.knowledge.remove(perm[1])
-                        inference_flag = True
-                        #new sentence added. Break out and check if inference 1 and 2 applies
-                        break
+        self.propagate(pending)
+
+    def propagate(self, pending):
+        """
+        Makes every inference that follows from the sentences in `pending`,
+        a queue of sentences that are new or have changed.
+
+        Only these sentences can give new conclusions: each one is checked
+        for known mines and safes, and against the sentences sharing a cell
+        with it for subsets. Whatever changes as a result goes back on the
+        queue, so the work done is proportional to what changed rather than
+        to the size of the knowledge base.
+        """
+        while pending:
+            sent = pending.popleft()
+
+            # skip sentences that were emptied or replaced since they were queued
+            if sent not in self.knowledge:
+                continue
+
+            # 1st and 2nd inference i.e. all cells are mines or all cells are safe. Marking them
+            # changes every sentence containing them, including this one
+            mines = sent.known_mines()
+            safes = sent.known_safes()
+            if mines or safes:
+                for cell in mines:
+                    pending.extend(self.mark_mine(cell))
+                for cell in safes:
+                    pending.extend(self.mark_safe(cell))
+                continue
+
+            # 3rd inference i.e. if a set is a subset of another set, replace the larger set with the
+            # difference. Only sentences sharing a cell can be subsets or supersets of this one
+            for other in self.knowledge.overlapping(sent):
+                if other.issubset(sent):
+                    smaller, larger = other, sent
+                elif sent.issubset(other):
+                    smaller, larger = sent, other
+                else:
+                    continue
+
+                self.knowledge.remove(larger)
+                new_sent = larger.difference(smaller)
+                if self.knowledge.add(new_sent):
+                    pending.append(new_sent)
+
+                # this sentence was replaced, its difference is queued instead
+                if larger is sent:
+                    break
 
     def make_safe_move(self):
         """
@@ -269,71 +693,339 @@ class MinesweeperAI():
     def make_random_move(self):
         """
         Returns a move to make on the Minesweeper board.
-        Should choose randomly among cells that:
+        Should choose among cells that:
             1) have not already been chosen, and
             2) are not known to be mines
+        picking the cell least likely to be a mine according to
+        `mine_probabilities`. Ties go to the cell with the fewest
+        neighbours, then to the lowest cell, so on a fresh board the
+        move is always the corner (0, 0).
         """
-        random_set = set()
-        for i in range(self.height):
-            for k in range(self.width):
-                if (i, k) not in self.moves_made and (i, k) not in self.mines:
-                    random_set.add((i, k))
+        probabilities, interior_probability = self.mine_probabilities()
+
+        # among the safest cells prefer those with the fewest neighbours, which
+        # are the most likely to have no mines around them and open up the board
+        best = None
+        if probabilities:
+            best = min(probabilities, key=lambda cell: (
+                round(probabilities[cell], 12), self.neighbour_count(cell), cell))
+            key = (round(probabilities[best], 12), self.neighbour_count(best), best)
+
+        # cells outside the frontier all share one probability, so only the best
+        # placed of them is looked up, and only when it can beat the frontier
+        if interior_probability is not None and (
+                best is None or round(interior_probability, 12) <= key[0]):
+            cell = self.interior_cell(probabilities)
+            if best is None or (round(interior_probability, 12),
+                                self.neighbour_count(cell), cell) < key:
+                best = cell
+        return best
+
+    def interior_cell(self, frontier):
+        """
+        Returns the cell outside `frontier` that has not been chosen and is
+        not known to be safe or a mine with the fewest neighbours, the lowest
+        such cell on ties.
+
+        Border cells, corners first, are checked before the cells inside
+        the border, which all have eight neighbours.
+        """
+        def unknown(cell):
+            return (cell not in frontier and cell not in self.moves_made
+                    and cell not in self.mines and cell not in self.safes)
 
-        if len(random_set) > 0:
-            return random_set.pop()
+        border = {(i, j) for i in (0, self.height - 1) for j in range(self.width)}
+        border.update((i, j) for i in range(self.height) for j in (0, self.width - 1))
+        candidates = [cell for cell in border if unknown(cell)]
+        if candidates:
+            return min(candidates, key=lambda cell: (self.neighbour_count(cell), cell))
+        for i in range(1, self.height - 1):
+            for j in range(1, self.width - 1):
+                if unknown((i, j)):
+                    return (i, j)
         return None
 
+    def neighbour_count(self, cell):
+        """
+        Returns the number of cells of the board next to `cell`.
+        """
+        i, j = cell
+        rows = min(i + 1, self.height - 1) - max(i - 1, 0) + 1
+        columns = min(j + 1, self.width - 1) - max(j - 1, 0) + 1
+        return rows * columns - 1
+
+    def mine_probabilities(self):
+        """
+        Returns a tuple (probabilities, interior_probability), where
+        probabilities maps every cell of the frontier, the cells in some
+        sentence, and every cell known to be safe but not yet chosen to
+        the probability that it is a mine, and interior_probability is the
+        mine probability shared by all other cells that have not been
+        chosen and are not known to be mines, or None if there are none.
+
+        The frontier is split into components of cells linked by sentences.
+        The consistent assignments of each component are counted
+        independently by `solve_component`, by number of mines. With
+        `total_mines` known, the components and the cells outside every
+        sentence are combined so that each assignment of the whole board
+        with the right number of mines is equally likely. Otherwise
+        components are treated independently and cells outside the
+        frontier get the average mine density of the frontier.
+        """
+        probabilities = {}
+        components = []
+        for sentences in self.frontier_components():
+            constraints = tuple(sorted((tuple(sorted(sent)), sent.count)
+                                       for sent in sentences))
+            solution = solve_component(constraints)
+            if solution is None:
+                # too large to enumerate, estimate from its sentences
+                for cells, count in constraints:
+                    for cell in cells:
+                        probabilities[cell] = max(probabilities.get(cell, 0), count / len(cells))
+            else:
+                components.append(solution)
+
+        frontier = set(probabilities).union(*(cells for cells, _, _ in components))
+        interior = self.height * self.width - len(
+            frontier | self.moves_made | self.mines | self.safes)
+        remaining = None
+        if self.total_mines is not None:
+            remaining = self.total_mines - len(self.mines) - sum(
+                probabilities.values())
+        interior_probability = combine_components(components, interior, remaining, probabilities)
+
+        for cell in self.safes - self.moves_made - frontier:
+            probabilities[cell] = 0
+        return probabilities, interior_probability if interior else None
+
+    def frontier_components(self):
+        """
+        Returns the sentences of the knowledge base grouped into connected
+        components, two sentences being connected if they share a cell.
+        """
+        components = []
+        seen = set()
+        for sent in self.knowledge:
+            if id(sent) in seen:
+                continue
+            seen.add(id(sent))
+            component = [sent]
+            queue = [sent]
+            while queue:
+                for other in self.knowledge.overlapping(queue.pop()):
+                    if id(other) not in seen:
+                        seen.add(id(other))
+                        component.append(other)
+                        queue.append(other)
+            components.append(component)
+        return components
+
     def create_sentence(self, cell, count):
         """
         Returns a sentence with all the neighbors and its count for the input cell.
         """
-        # store all the possible moves in this board
-        possible_moves = set()
-        for i in range(self.height):
-            for j in range(self.width):
-                possible_moves.add((i, j))
-
-        # remove the current cell that was clicked
-        possible_moves.remove(cell)
-
-        # creates all the neighbors for the cell. Some moves may not be possible i.e. for the
-        # corner cell. This is filtered out using the possible moves set created above
-        right_neighbor = (cell[0], cell[1] + 1)
-        left_neighbor = (cell[0], cell[1] - 1)
-        up_neighbor = (cell[0] - 1, cell[1])
-        down_neighbor = (cell[0] + 1, cell[1])
-        diag_right_down = (cell[0] + 1, cell[1] + 1)
-        diag_left_down = (cell[0] + 1, cell[1] - 1)
-        diag_right_up = (cell[0] - 1, cell[1] + 1)
-        diag_left_up = (cell[0] - 1, cell[1] - 1)
-
+        # neighbors known to be safe are left out, and so are neighbors known to be mines,
+        # which are taken off the count
         cell_neighbors = set()
+        for neighbor in self.geometry.neighbours(cell):
+            if neighbor in self.mines:
+                count -= 1
+            elif neighbor not in self.safes:
+                cell_neighbors.add(neighbor)
 
-        # filter all the neighbor cells for the given cell
-        if right_neighbor in possible_moves and right_neighbor not in self.safes:
-            cell_neighbors.add(right_neighbor)
+        if self.bitsets:
+            return BitSentence(cell_neighbors, count, self.width)
+        return Sentence(cell_neighbors, count)
 
-        if left_neighbor in possible_moves and left_neighbor not in self.safes:
-            cell_neighbors.add(left_neighbor)
 
-        if up_neighbor in possible_moves and up_neighbor not in self.safes:
-            cell_neighbors.add(up_neighbor)
+@functools.lru_cache(maxsize=4096)
+def solve_component(constraints):
+    """
+    Counts the assignments of mines to the cells of one frontier component
+    that satisfy all its constraints, a tuple of (cells, count) pairs.
 
-        if down_neighbor in possible_moves and down_neighbor not in self.safes:
-            cell_neighbors.add(down_neighbor)
+    Returns a tuple (cells, totals, mine_counts) where totals[m] is the
+    number of assignments with m mines and mine_counts[m][x] the number of
+    those in which cells[x] is a mine, or None if the component needs more
+    than MAX_COMPONENT_STATES states. Results are cached, so components
+    left unchanged by a move are not counted again.
 
-        if diag_right_down in possible_moves and diag_right_down not in self.safes:
-            cell_neighbors.add(diag_right_down)
+    Cells are assigned one at a time. Assignments of the first cells that
+    leave the same mines still needed by every partly assigned constraint
+    are counted together, so the work grows with the width of the frontier
+    rather than exponentially with its length.
+    """
+    # order cells so that each constraint is completed as early as possible
+    order = []
+    placed = set()
+    for cells, _ in constraints:
+        for cell in cells:
+            if cell not in placed:
+                placed.add(cell)
+                order.append(cell)
+    index = {cell: x for x, cell in enumerate(order)}
+
+    # constraints starting at each cell, and the cells each one still has left after it
+    starting = [[] for _ in order]
+    left_after = [{} for _ in order]
+    for c, (cells, _) in enumerate(constraints):
+        positions = sorted(index[cell] for cell in cells)
+        starting[positions[0]].append(c)
+        for remaining, x in enumerate(reversed(positions)):
+            left_after[x][c] = remaining
+
+    def step(x, state, value):
+        # mines still needed by open constraints after giving cell x `value`, or None
+        needs = dict(state)
+        for c in starting[x]:
+            needs[c] = constraints[c][1]
+        for c, left in left_after[x].items():
+            need = needs[c] - value
+            if not 0 <= need <= left:
+                return None
+            if left == 0:
+                del needs[c]
+            else:
+                needs[c] = need
+        return tuple(sorted(needs.items()))
+
+    # forward[x] maps each state before cell x to the assignments reaching it, by mines
+    forward = [{(): {0: 1}}]
+    transitions = []
+    for x in range(len(order)):
+        layer = {}
+        moves = {}
+        for state, ways in forward[x].items():
+            moves[state] = (step(x, state, 0), step(x, state, 1))
+            for value, following in enumerate(moves[state]):
+                if following is not None:
+                    add_shifted(layer.setdefault(following, {}), ways, value)
+        if len(layer) > MAX_COMPONENT_STATES:
+            return None
+        forward.append(layer)
+        transitions.append(moves)
+
+    # backward[x] maps each state before cell x to the ways of completing it, by mines
+    backward = [None] * len(order) + [{(): {0: 1}}]
+    for x in reversed(range(len(order))):
+        layer = {}
+        for state, following in transitions[x].items():
+            ways = {}
+            for value, state_after in enumerate(following):
+                if state_after in backward[x + 1]:
+                    add_shifted(ways, backward[x + 1][state_after], value)
+            layer[state] = ways
+        backward[x] = layer
+
+    totals = forward[-1].get((), {})
+    mine_counts = {m: [0] * len(order) for m in totals}
+    for x in range(len(order)):
+        for state, (_, state_after) in transitions[x].items():
+            if state_after is None or state_after not in backward[x + 1]:
+                continue
+            for m1, before in forward[x][state].items():
+                for m2, after in backward[x + 1][state_after].items():
+                    mine_counts[m1 + 1 + m2][x] += before * after
+    return tuple(order), totals, mine_counts
 
-        if diag_left_down in possible_moves and diag_left_down not in self.safes:
-            cell_neighbors.add(diag_left_down)
 
-        if diag_right_up in possible_moves and diag_right_up not in self.safes:
-            cell_neighbors.add(diag_right_up)
+def add_shifted(target, ways, shift):
+    """
+    Helper function that adds the counts of `ways`, by number of mines, to
+    `target` with `shift` more mines each.
+    """
+    for m, count in ways.items():
+        target[m + shift] = target.get(m + shift, 0) + count
+
+
+def combine_components(components, interior, remaining, probabilities):
+    """
+    Adds the mine probability of every cell of the solved `components` to
+    `probabilities` and returns the mine probability of each of the
+    `interior` cells outside the frontier.
+
+    If `remaining`, the number of mines left outside known mines and
+    estimated components, is given, a component assignment with m mines is
+    weighed by the number of ways of completing it with the other
+    components and the interior cells. Weights are kept as distributions
+    and log binomials so that they do not overflow on large boards.
+    """
+    distributions = []
+    for _, totals, _ in components:
+        size = max(totals) + 1 if totals else 1
+        total = sum(totals.values())
+        distributions.append([totals.get(m, 0) / total if total else 0 for m in range(size)])
 
-        if diag_left_up in possible_moves and diag_left_up not in self.safes:
-            cell_neighbors.add(diag_left_up)
+    weights = None
+    if remaining is not None:
+        remaining = int(round(remaining))
+        logs = [log_binomial(interior, remaining - j)
+                for j in range(sum(len(d) - 1 for d in distributions) + 1)]
+        top = max(logs)
+        if top > -math.inf:
+            weights = [math.exp(value - top) for value in logs]
 
-        if len(cell_neighbors) > 0:
-            return Sentence(cell_neighbors, count)
-        return Sentence(set(), count)
+    if weights is not None:
+        # distributions of the mines in all components before and after each one
+        prefix = [[1.0]]
+        for distribution in distributions:
+            prefix.append(convolve(prefix[-1], distribution))
+        suffix = [[1.0]]
+        for distribution in reversed(distributions):
+            suffix.append(convolve(suffix[-1], distribution))
+        suffix.reverse()
+
+        everything = prefix[-1]
+        z = sum(p * weights[j] for j, p in enumerate(everything))
+
+        # no assignment fits the number of mines left, so ignore it
+        if z == 0:
+            weights = None
+
+    if weights is None:
+        for cells, totals, mine_counts in components:
+            total = sum(totals.values())
+            for x, cell in enumerate(cells):
+                probabilities[cell] = sum(counts[x] for counts in mine_counts.values()) / total
+        frontier = sum(len(cells) for cells, _, _ in components)
+        expected = sum(sum(m * t for m, t in totals.items()) / sum(totals.values())
+                       for _, totals, _ in components)
+        return expected / frontier if frontier else 0
+
+    for k, (cells, totals, mine_counts) in enumerate(components):
+        others = convolve(prefix[k], suffix[k + 1])
+        total = sum(totals.values())
+        for m, counts in mine_counts.items():
+            # weight of this component having m mines, given everything else
+            weight = sum(p * weights[j + m] for j, p in enumerate(others)) / (total * z)
+            for x, cell in enumerate(cells):
+                probabilities[cell] = probabilities.get(cell, 0) + counts[x] * weight
+
+    if interior == 0:
+        return 0
+    expected = sum(p * weights[j] * (remaining - j) for j, p in enumerate(everything)) / z
+    return expected / interior
+
+
+def convolve(a, b):
+    """
+    Helper function that returns the distribution of the sum of two
+    independent mine counts with distributions `a` and `b`.
+    """
+    result = [0.0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                result[i + j] += x * y
+    return result
+
+
+def log_binomial(n, k):
+    """
+    Helper function that returns the natural log of n choose k, or minus
+    infinity if it is zero.
+    """
+    if k < 0 or k > n:
+        return -math.inf
+    return math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)
@@ -0,0 +1,149 @@
+import argparse
+import json
+import multiprocessing
+import random
+import statistics
+import time
+
+import numpy as np
+
+from minesweeper import ArrayMinesweeper, Minesweeper, MinesweeperAI
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play Minesweeper games with MinesweeperAI headlessly.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--height", type=int, default=8)
+    parser.add_argument("--width", type=int, default=8)
+    parser.add_argument("--density", type=float, default=0.125,
+                        help="fraction of the cells that are mines")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bitsets", action="store_true",
+                        help="store the AI's knowledge as BitSentence, "
+                        "which saves memory but is slower")
+    parser.add_argument("--total-mines", action="store_true",
+                        help="tell the AI how many mines the board has")
+    parser.add_argument("--numpy", action="store_true",
+                        help="play on NumPy-backed ArrayMinesweeper boards")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    mines = min(args.height * args.width,
+                int(round(args.density * args.height * args.width)))
+    tasks = [(args.seed * 1000003 + game, args.height, args.width, mines,
+              args.bitsets, args.total_mines, args.numpy)
+             for game in range(args.games)]
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        games = list(pool.imap_unordered(play_game, tasks,
+                                         chunksize=max(1, len(tasks) // 256)))
+    elapsed = time.perf_counter() - start
+
+    report = summarize(games, elapsed, args.height, args.width, mines)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def play_game(task):
+    """
+    Plays one game of the AI on a board seeded by the task, and returns
+    whether it won with the time of every add_knowledge call and the size
+    of the knowledge base after it.
+    """
+    seed, height, width, mines, bitsets, total_mines, array_board = task
+
+    # ArrayMinesweeper draws its mines from a generator, Minesweeper from the random module
+    if array_board:
+        game = ArrayMinesweeper(height=height, width=width, mines=mines,
+                                rng=np.random.default_rng(seed))
+    else:
+        random.seed(seed)
+        game = Minesweeper(height=height, width=width, mines=mines)
+    ai = MinesweeperAI(height=height, width=width, bitsets=bitsets,
+                       total_mines=mines if total_mines else None)
+
+    seconds = []
+    knowledge = []
+    guesses = 0
+    lost = False
+    while len(ai.moves_made) < height * width - mines:
+        move = ai.make_safe_move()
+        if move is None:
+            move = ai.make_random_move()
+            guesses += 1
+            if move is None:
+                break
+        if game.is_mine(move):
+            lost = True
+            break
+        nearby = game.nearby_mines(move)
+        start = time.perf_counter()
+        ai.add_knowledge(move, nearby)
+        seconds.append(time.perf_counter() - start)
+        knowledge.append(len(ai.knowledge))
+
+    return {
+        "won": not lost and len(ai.moves_made) == height * width - mines,
+        "moves": len(ai.moves_made),
+        "guesses": guesses,
+        "seconds": seconds,
+        "knowledge": knowledge,
+    }
+
+
+def summarize(games, elapsed, height, width, mines):
+    """
+    Returns the report of a batch of games: throughput, win rate, guesses
+    per game, add_knowledge latency and knowledge base sizes.
+    """
+    seconds = sorted(s for game in games for s in game["seconds"])
+    knowledge = [size for game in games for size in game["knowledge"]]
+    wins = sum(game["won"] for game in games)
+    return {
+        "board": {"height": height, "width": width, "mines": mines},
+        "games": len(games),
+        "seconds": elapsed,
+        "games_per_second": len(games) / elapsed if elapsed else 0,
+        "wins": wins,
+        "win_rate": wins / len(games) if games else 0,
+        "mean_moves": statistics.mean(g["moves"] for g in games) if games else 0,
+        "mean_guesses": statistics.mean(g["guesses"] for g in games) if games else 0,
+        "add_knowledge_calls": len(seconds),
+        "mean_add_knowledge_ms": 1000 * statistics.mean(seconds) if seconds else 0,
+        "p99_add_knowledge_ms": 1000 * seconds[min(len(seconds) - 1,
+                                                   int(0.99 * len(seconds)))]
+        if seconds else 0,
+        "mean_knowledge": statistics.mean(knowledge) if knowledge else 0,
+        "max_knowledge": max(knowledge, default=0),
+    }
+
+
+def print_report(report):
+    """
+    Prints a report from summarize as text.
+    """
+    board = report["board"]
+    print(f"{report['games']} games on a {board['height']}x{board['width']} "
+          f"board with {board['mines']} mines in {report['seconds']:.2f}s "
+          f"({report['games_per_second']:.1f} games/s, "
+          f"{60 * report['games_per_second']:.0f} games/min)")
+    print()
+    print(f"{'wins':<24}{report['wins']:>10} ({100 * report['win_rate']:.1f}%)")
+    print(f"{'mean moves':<24}{report['mean_moves']:>10.1f}")
+    print(f"{'mean guesses':<24}{report['mean_guesses']:>10.2f}")
+    print(f"{'add_knowledge calls':<24}{report['add_knowledge_calls']:>10}")
+    print(f"{'mean add_knowledge ms':<24}"
+          f"{report['mean_add_knowledge_ms']:>10.3f}")
+    print(f"{'p99 add_knowledge ms':<24}"
+          f"{report['p99_add_knowledge_ms']:>10.3f}")
+    print(f"{'mean knowledge size':<24}{report['mean_knowledge']:>10.1f}")
+    print(f"{'max knowledge size':<24}{report['max_knowledge']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+
+import pagerank
+
+# largest graph each benchmarked function is run on; the dictionary based
+# rankers are quadratic in the number of pages, crawling writes one file
+# per page and the corpus dictionary costs far more memory than arrays
+MAX_NODES = {
+    "crawl": 10 ** 5,
+    "crawl_parallel": 10 ** 5,
+    "sample_pagerank": 10 ** 3,
+    "iterate_pagerank": 2 * 10 ** 3,
+    "sample_pagerank_compiled": 10 ** 6,
+    "iterate_pagerank_sparse": 10 ** 6,
+}
+for method in pagerank.SOLVERS:
+    MAX_NODES[f"power_iteration:{method}"] = 10 ** 7
+
+# functions doing their work in worker processes, whose memory tracemalloc
+# does not see: their peak memory is only that of the calling process
+WORKER_FUNCTIONS = {"crawl_parallel"}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark PageRank on synthetic graphs.")
+    parser.add_argument("--scales", type=int, nargs="+",
+                        default=[10 ** 3, 10 ** 4, 10 ** 5],
+                        help="numbers of pages, e.g. 1000 ... 10000000")
+    parser.add_argument("--generators", nargs="+", default=list(GENERATORS),
+                        choices=list(GENERATORS))
+    parser.add_argument("--functions", nargs="+", default=list(MAX_NODES),
+                        choices=list(MAX_NODES))
+    parser.add_argument("--degree", type=float, default=5,
+                        help="average number of links per page")
+    parser.add_argument("--samples", type=int, default=pagerank.SAMPLES)
+    parser.add_argument("--tolerance", type=float, default=1e-8,
+                        help="convergence tolerance of the sparse solvers")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="runs per measurement, the fastest is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark.json")
+    args = parser.parse_args()
+
+    results = {
+        "environment": environment(),
+        "parameters": vars(args),
+        "results": [],
+    }
+    for name in args.generators:
+        for nodes in args.scales:
+            rng = np.random.default_rng(args.seed)
+            indptr, indices = GENERATORS[name](nodes, args.degree, rng)
+            for record in benchmark_graph(indptr, indices, args.functions,
+                                          pagerank.DAMPING, args.samples,
+                                          args.tolerance, args.repeat,
+                                          args.seed):
+                record["generator"] = name
+                results["results"].append(record)
+                print(f"{name:>10} {record['nodes']:>9} "
+                      f"{record['function']:<32} {record['seconds']:9.4f}s "
+                      f"{record['peak_bytes'] / 2 ** 20:9.1f} MiB"
+                      f"{'*' if record['workers_untraced'] else ' '} "
+                      f"L1 error {record['l1_error']}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if any(record["workers_untraced"] for record in results["results"]):
+        print("* memory of the calling process only, "
+              "not of its worker processes")
+    print(f"Results written to {args.output}")
+
+
+def erdos_renyi(n, degree, rng):
+    """
+    Return the out-link table, as from `pagerank.compile_transitions`, of
+    a random graph in which every page links to a Poisson(`degree`) number
+    of pages chosen uniformly at random.
+    """
+    out_degree = rng.poisson(degree, size=n)
+    sources = np.repeat(np.arange(n), out_degree)
+    targets = rng.integers(n, size=len(sources))
+    return link_table(n, sources, targets)
+
+
+def barabasi_albert(n, degree, rng):
+    """
+    Return the out-link table of a power-law graph grown by preferential
+    attachment. Every new page adds `degree` links, each either to an
+    earlier page chosen uniformly at random or, with equal probability,
+    to the target of an earlier link, so pages gain links in proportion
+    to the links they already have.
+    """
+    m = max(1, int(round(degree)))
+    sources = np.repeat(np.arange(1, n), m)
+    E = len(sources)
+
+    # link e may copy the target of any link created before page sources[e]
+    earlier = (sources - 1) * m
+    copy = (rng.random(E) < 0.5) & (earlier > 0)
+    targets = np.full(E, -1, dtype=np.int64)
+    targets[~copy] = rng.integers(sources[~copy])
+    parent = np.zeros(E, dtype=np.int64)
+    parent[copy] = rng.integers(earlier[copy])
+
+    # resolve chains of copied links by pointer jumping
+    pending = np.flatnonzero(copy)
+    while len(pending):
+        resolved = targets[parent[pending]]
+        done = resolved >= 0
+        targets[pending[done]] = resolved[done]
+        pending = pending[~done]
+        parent[pending] = parent[parent[pending]]
+
+    return link_table(n, sources, targets)
+
+
+def dangling_heavy(n, degree, rng, dangling_fraction=0.5):
+    """
+    Return the out-link table of a random graph like `erdos_renyi` in
+    which `dangling_fraction` of the pages have no links at all.
+    """
+    out_degree = rng.poisson(degree, size=n)
+    out_degree[rng.random(n) < dangling_fraction] = 0
+    sources = np.repeat(np.arange(n), out_degree)
+    targets = rng.integers(n, size=len(sources))
+    return link_table(n, sources, targets)
+
+
+GENERATORS = {
+    "erdos-renyi": erdos_renyi,
+    "power-law": barabasi_albert,
+    "dangling": dangling_heavy,
+}
+
+
+def link_table(n, sources, targets):
+    """
+    Helper function that drops self links and duplicate links and returns
+    the out-link table in CSR layout, with int32 arrays as in the binary
+    graph format of `pagerank.save_graph`.
+    """
+    keep = sources != targets
+    edges = np.unique(sources[keep].astype(np.int64) * n + targets[keep])
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edges // n, minlength=n), out=indptr[1:])
+    return indptr.astype(np.int32), (edges % n).astype(np.int32)
+
+
+def page_names(n):
+    """
+    Helper function that returns the page name of every page id.
+    """
+    return [f"{i}.html" for i in range(n)]
+
+
+def table_to_corpus(indptr, indices):
+    """
+    Helper function that returns the corpus dictionary of an out-link table.
+    """
+    return pagerank.graph_to_corpus(page_names(len(indptr) - 1),
+                                    indptr, indices)
+
+
+def write_corpus(directory, indptr, indices):
+    """
+    Helper function that writes an out-link table as a directory of HTML
+    pages that `pagerank.crawl` can parse.
+    """
+    names = page_names(len(indptr) - 1)
+    for i, name in enumerate(names):
+        links = "".join(f'<a href="{names[j]}">{names[j]}</a>\n'
+                        for j in indices[indptr[i]:indptr[i + 1]])
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(f"<!DOCTYPE html>\n<html>\n<body>\n{links}</body>\n</html>\n")
+
+
+def benchmark_graph(indptr, indices, functions, damping_factor, samples,
+                    tolerance, repeat, seed):
+    """
+    Time each of `functions` on one graph, measure its peak memory and
+    its L1 distance from a tightly converged reference ranking.
+
+    The peak memory is what tracemalloc sees allocated in this process.
+    The functions in `WORKER_FUNCTIONS` do most of their work in worker
+    processes, which it does not see, so their records are marked with
+    `workers_untraced` and undercount their memory.
+
+        Returns:
+            records (list) : one dictionary per function that was run
+    """
+    n = len(indptr) - 1
+    matrix, dangling = pagerank.graph_matrix(indptr, indices)
+    reference = pagerank.power_iteration(matrix, dangling, damping_factor,
+                                         tolerance=1e-12,
+                                         max_iterations=10000)
+
+    corpus = None
+    if any(n <= MAX_NODES[f] for f in functions if not f.startswith("power")):
+        corpus = table_to_corpus(indptr, indices)
+
+    records = []
+    with tempfile.TemporaryDirectory() as directory:
+        if any(f.startswith("crawl") and n <= MAX_NODES[f] for f in functions):
+            write_corpus(directory, indptr, indices)
+
+        runs = {
+            "crawl": lambda: pagerank.crawl(directory),
+            "crawl_parallel": lambda: pagerank.crawl_parallel(directory),
+            "sample_pagerank": lambda: pagerank.sample_pagerank(
+                corpus, damping_factor, samples),
+            "iterate_pagerank": lambda: pagerank.iterate_pagerank(
+                corpus, damping_factor),
+            "sample_pagerank_compiled": lambda: (
+                pagerank.sample_pagerank_compiled(
+                    corpus, damping_factor, samples, seed=seed)),
+            "iterate_pagerank_sparse": lambda: pagerank.iterate_pagerank_sparse(
+                corpus, damping_factor, tolerance),
+        }
+        for method in pagerank.SOLVERS:
+            runs[f"power_iteration:{method}"] = (
+                lambda method=method: pagerank.power_iteration(
+                    matrix, dangling, damping_factor, tolerance,
+                    method=method))
+
+        for function in functions:
+            if n > MAX_NODES[function]:
+                continue
+            seconds, peak, ranks = measure(runs[function], repeat)
+            error = None
+            if not function.startswith("crawl"):
+                error = float(np.abs(as_array(ranks, n) - reference).sum())
+            records.append({
+                "function": function,
+                "nodes": n,
+                "edges": len(indices),
+                "seconds": seconds,
+                "peak_bytes": peak,
+                "workers_untraced": function in WORKER_FUNCTIONS,
+                "l1_error": error,
+            })
+    return records
+
+
+def measure(run, repeat):
+    """
+    Helper function that returns the fastest wall time of `repeat` calls,
+    the peak memory allocated during one more traced call, and the result.
+    """
+    seconds = float("inf")
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        run()
+        seconds = min(seconds, time.perf_counter() - start)
+
+    tracemalloc.start()
+    result = run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, result
+
+
+def as_array(ranks, n):
+    """
+    Helper function that returns rankings keyed by page name as an array
+    ordered by page id, and passes arrays through unchanged.
+    """
+    if isinstance(ranks, dict):
+        return np.array([ranks[name] for name in page_names(n)])
+    return np.asarray(ranks)
+
+
+def environment():
+    """
+    Helper function that describes where the benchmark ran, so results
+    from different versions and machines can be told apart.
+    """
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "machine": platform.machine(),
+        "processors": os.cpu_count(),
+    }
+
+
+if __name__ == "__main__":
+    main()
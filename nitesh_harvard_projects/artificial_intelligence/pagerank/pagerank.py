@@ -1,11 +1,36 @@
+import json
+import multiprocessing
 import os
 import random
 import re
+import struct
 import sys
+import time
+
+import numpy as np
+from scipy import sparse
 
 DAMPING = 0.85
 SAMPLES = 10000
 
+# the sparse solvers stop once the ranks change by at most TOLERANCE in
+# total (L1 norm) between two iterations, however many pages there are
+TOLERANCE = 1e-8
+
+# update_pagerank stops updating pages one at a time, and falls back to
+# full power iteration, once more than this fraction of the pages needs it
+LOCAL_UPDATE_FRACTION = 0.1
+CHUNK_SIZE = 1 << 16
+LINK_PATTERN = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+
+# binary graph files start with GRAPH_MAGIC, then the number of pages,
+# links and bytes of page names, see save_graph
+GRAPH_MAGIC = b"PRGRAPH1"
+GRAPH_HEADER = struct.Struct("<8sqqq")
+
+# out-link table shared with the walker processes of sample_pagerank_parallel
+WALK_TABLE = None
+
 
 def main():
     if len(sys.argv) != 2:
@@ -35,7 +60,7 @@ def crawl(directory):
             continue
         with open(os.path.join(directory, filename)) as f:
             contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
+            links = LINK_PATTERN.findall(contents)
             pages[filename] = set(links) - {filename}
 
     # Only include links to other pages in the corpus
@@ -48,6 +73,65 @@ def crawl(directory):
     return pages
 
 
+def crawl_parallel(directory, index_path=None, processes=None,
+                   chunk_size=CHUNK_SIZE):
+    """
+    Parse a directory of HTML pages like `crawl`, extracting links from
+    each file in chunks of `chunk_size` characters in a process pool.
+
+    If `index_path` is given, the links found in every file are saved
+    there keyed by file path, modification time and size, and on later
+    runs only files that were added or changed since are parsed again.
+
+    Return a dictionary where each key is a page, and values are
+    a set of all other pages in the corpus that are linked to by the page.
+    """
+    index = load_link_index(index_path)
+    new_index = dict()
+    pages = dict()
+    stale = []
+
+    # reuse the links of files that have not changed since the last run
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".html") or not entry.is_file():
+                continue
+            path = os.path.abspath(entry.path)
+            stat = entry.stat()
+            cached = index.get(path)
+            if cached is not None and cached[:2] == [stat.st_mtime_ns, stat.st_size]:
+                new_index[path] = cached
+                pages[entry.name] = set(cached[2])
+            else:
+                stale.append((path, stat.st_mtime_ns, stat.st_size))
+
+    # parse everything else, in parallel when there is more than one file
+    tasks = [(path, chunk_size) for path, _, _ in stale]
+    processes = processes or os.cpu_count() or 1
+    if len(tasks) > 1 and processes > 1:
+        with multiprocessing.Pool(processes) as pool:
+            batch = max(1, len(tasks) // (4 * processes))
+            found = pool.map(extract_links, tasks, chunksize=batch)
+    else:
+        found = [extract_links(task) for task in tasks]
+
+    for (path, mtime, size), links in zip(stale, found):
+        new_index[path] = [mtime, size, sorted(links)]
+        pages[os.path.basename(path)] = links
+
+    if index_path is not None:
+        save_link_index(index_path, new_index)
+
+    # Only include links to other pages in the corpus
+    for filename in pages:
+        pages[filename] = set(
+            link for link in pages[filename]
+            if link in pages
+        )
+
+    return pages
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -116,7 +200,84 @@ def sample_pagerank(corpus, damping_factor, n):
     return rank_dictionary
 
 
-def iterate_pagerank(corpus, damping_factor):
+def sample_pagerank_compiled(corpus, damping_factor, n, walkers=1024,
+                             seed=None):
+    """
+    Return PageRank values for each page by sampling `n` pages with a
+    transition table compiled once from the corpus.
+
+    Each step is O(1) regardless of corpus size: a coin flip decides
+    between a uniform jump and a uniform pick among the page's out-links,
+    read straight from a CSR link array. `walkers` independent chains
+    are advanced together so samples are drawn in NumPy batches from a
+    generator seeded with `seed`; `walkers=1` gives a single chain like
+    `sample_pagerank`.
+
+    Return a dictionary where keys are page names, and values are
+    their estimated PageRank value (a value between 0 and 1). All
+    PageRank values should sum to 1.
+    """
+    rank_dictionary = {}
+    if len(corpus.keys()) != 0 and n > 0:
+        pages, indptr, indices = compile_transitions(corpus)
+        rng = np.random.default_rng(seed)
+        counts = random_walk_counts(indptr, indices, damping_factor, n,
+                                    walkers, rng)
+        rank_dictionary = {page: int(counts[i]) / n
+                           for i, page in enumerate(pages)}
+
+    return rank_dictionary
+
+
+def sample_pagerank_parallel(corpus, damping_factor, n, walkers=None,
+                             seed=None, target_error=None, rounds=10):
+    """
+    Return PageRank values for each page by splitting `n` samples across
+    `walkers` independent Markov chains run in a process pool.
+
+    Every walker draws from its own stream spawned from `seed`, and the
+    visit counts are merged at the end. The budget is spent in `rounds`
+    equal parts; if `target_error` is given, sampling stops after the
+    first round in which every page's standard error is at or below it.
+
+    Return a tuple `(ranks, errors)` of dictionaries keyed by page name:
+    the estimated PageRank values, which sum to 1, and the standard error
+    of each estimate across walkers.
+    """
+    if len(corpus.keys()) == 0 or n <= 0:
+        return {}, {}
+
+    walkers = walkers or os.cpu_count() or 1
+    rounds = max(1, rounds)
+    pages, indptr, indices = compile_transitions(corpus)
+    streams = np.random.SeedSequence(seed).spawn(walkers)
+
+    # samples per walker for each round, spreading any remainder evenly
+    budget = np.full(walkers, n // walkers)
+    budget[:n % walkers] += 1
+    per_round = [np.diff(np.linspace(0, b, rounds + 1).astype(np.int64))
+                 for b in budget]
+
+    counts = np.zeros((walkers, len(pages)), dtype=np.int64)
+    errors = np.full(len(pages), np.inf)
+    with multiprocessing.Pool(min(walkers, os.cpu_count() or 1),
+                              initializer=load_walk_table,
+                              initargs=(indptr, indices)) as pool:
+        for r in range(rounds):
+            tasks = [(damping_factor, per_round[k][r], streams[k].spawn(1)[0])
+                     for k in range(walkers)]
+            counts += np.array(pool.map(walker_counts, tasks))
+            errors = standard_errors(counts)
+            if target_error is not None and errors.max() <= target_error:
+                break
+
+    total = counts.sum()
+    ranks = counts.sum(axis=0) / total
+    return ({page: float(ranks[i]) for i, page in enumerate(pages)},
+            {page: float(errors[i]) for i, page in enumerate(pages)})
+
+
+def iterate_pagerank(corpus, damping_factor, stats=None):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
@@ -124,7 +285,13 @@ def iterate_pagerank(corpus, damping_factor):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    If a `stats` dictionary is given, it is filled with the number of
+    `iterations`, the L1 `residuals` of every iteration and the
+    `elapsed` time in seconds.
     """
+    start = time.perf_counter()
+    residuals = []
     N = len(corpus.keys())
     rank_dict = {}
 
@@ -150,14 +317,251 @@ def iterate_pagerank(corpus, damping_factor):
                 pr += damping_factor * get_probability(corpus, key, rank_dict)
                 rank_dict_next[key] = pr
 
+            residuals.append(sum(abs(rank_dict_next[key] - rank_dict[key])
+                                 for key in rank_dict))
             if check_convergence(rank_dict, rank_dict_next):
                 not_converged = False
             else:
                 rank_dict = rank_dict_next.copy()
 
+    if stats is not None:
+        record_stats(stats, "dictionary", residuals, start)
     return rank_dict
 
 
+def iterate_pagerank_sparse(corpus, damping_factor, tolerance=TOLERANCE,
+                            max_iterations=1000, method="power", stats=None):
+    """
+    Return PageRank values for each page by damped power iteration
+    over a sparse adjacency matrix built once from the corpus.
+
+    Produces the same `{page: rank}` dictionary as `iterate_pagerank`,
+    but each iteration is a single sparse mat-vec instead of a scan of
+    the whole corpus per page, so it scales to millions of edges.
+
+        Parameters:
+            corpus (dict) : Python dictionary mapping a page name
+            to a set of all pages linked to it.
+
+            damping_factor (float) : probability of following a link
+
+            tolerance (float) : stop once the ranks change by at most
+            this amount in total (L1 norm) between two iterations
+
+            max_iterations (int) : upper bound on the number of iterations
+
+            method (str) : solver to use, one of the keys of `SOLVERS`:
+            "power" or "quadratic"
+
+            stats (dict) : if given, filled with the `method`, number of
+            `iterations`, L1 `residuals` per iteration and `elapsed` seconds
+        Returns:
+            rank_dict (dict) : Python dictionary mapping each page to its
+            PageRank value
+    """
+    pages, matrix, dangling = build_sparse_graph(corpus)
+    ranks = power_iteration(matrix, dangling, damping_factor, tolerance,
+                            max_iterations, method, stats)
+    return {page: float(ranks[i]) for i, page in enumerate(pages)}
+
+
+def update_pagerank(pages, indptr, indices, ranks, changes, damping_factor,
+                    tolerance=TOLERANCE, max_iterations=1000):
+    """
+    Return PageRank values after a change to a compiled graph, starting
+    from the previous PageRank values instead of from 1 / N.
+
+    The changes are applied to the out-link arrays directly, so the graph
+    stays compiled between updates instead of being rebuilt from a corpus.
+    One step from the previous ranks shows how far each page is from
+    converged, and only pages that are off by more than `tolerance` / 2N
+    are updated, passing their change on to the pages they link to. If
+    more than LOCAL_UPDATE_FRACTION of the pages need updating, full power
+    iteration takes over from the current ranks.
+
+        Parameters:
+            pages (list) : page names, indexed by their integer id
+
+            indptr (numpy.ndarray) : out-links of page i are stored in
+            indices[indptr[i]:indptr[i + 1]], as returned by
+            `compile_transitions` or `load_graph`
+
+            indices (numpy.ndarray) : integer ids of linked pages
+
+            ranks (numpy.ndarray) : PageRank value for each page id
+
+            changes (dict) : maps each added or changed page to its new set
+            of links, and each removed page to None
+
+            damping_factor (float) : probability of following a link
+        Returns:
+            pages (list) : page names of the changed graph, the remaining
+            pages in their previous order followed by the added pages
+
+            indptr (numpy.ndarray) : out-link offsets of the changed graph
+
+            indices (numpy.ndarray) : out-link targets of the changed graph
+
+            ranks (numpy.ndarray) : PageRank value for each new page id
+    """
+    pages, indptr, indices, kept = apply_graph_changes(pages, indptr, indices,
+                                                       changes)
+    N = len(pages)
+    if N == 0:
+        return pages, indptr, indices, np.zeros(0)
+
+    # warm start from the previous ranks, new pages start at 1 / N
+    x = np.full(N, 1 / N)
+    x[:len(kept)] = np.asarray(ranks)[kept]
+    x /= x.sum()
+    x = local_power_iteration(indptr, indices, damping_factor, x, tolerance,
+                              max_iterations)
+    return pages, indptr, indices, x
+
+
+def personalized_pagerank(corpus, damping_factor, teleports,
+                          tolerance=TOLERANCE, max_iterations=1000):
+    """
+    Return personalized PageRank values for many teleport distributions
+    at once, solved together in one batched power iteration.
+
+    Instead of jumping to a page chosen uniformly at random, the random
+    surfer of each ranking jumps according to its own teleport
+    distribution, which is also where pages with no links send it.
+
+        Parameters:
+            corpus (dict) : Python dictionary mapping a page name
+            to a set of all pages linked to it.
+
+            damping_factor (float) : probability of following a link
+
+            teleports (list) : one dictionary per ranking, mapping seed
+            pages to their teleport weight, e.g. {"ai.html": 1} for a
+            single seed page. Weights are normalised to sum to 1.
+        Returns:
+            rankings (list) : one dictionary per teleport distribution,
+            mapping each page to its PageRank value
+    """
+    pages, matrix, dangling = build_sparse_graph(corpus)
+    page_ids = {page: i for i, page in enumerate(pages)}
+    teleport = np.zeros((len(pages), len(teleports)))
+    for k, weights in enumerate(teleports):
+        for page, weight in weights.items():
+            teleport[page_ids[page], k] = weight
+
+    ranks = batched_power_iteration(matrix, dangling, damping_factor,
+                                    teleport, tolerance, max_iterations)
+    return [{page: float(ranks[i, k]) for i, page in enumerate(pages)}
+            for k in range(len(teleports))]
+
+
+def save_graph(corpus, path):
+    """
+    Write the corpus to `path` in a compact binary format that can be
+    memory-mapped by `load_graph` instead of loading Python sets.
+
+    The file holds a header, the UTF-8 page names with an int64 offset
+    table, then an int32 offset array and an int32 target array in CSR
+    layout: page i links to targets[offsets[i]:offsets[i + 1]]. Every
+    section starts on an 8 byte boundary.
+    """
+    pages, indptr, indices = compile_transitions(corpus)
+    if len(indices) >= 2 ** 31:
+        raise ValueError("Too many links for the int32 graph format")
+
+    encoded = [page.encode("utf-8") for page in pages]
+    name_offsets = np.zeros(len(pages) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in encoded], out=name_offsets[1:])
+    names = b"".join(encoded)
+
+    with open(path, "wb") as f:
+        f.write(GRAPH_HEADER.pack(GRAPH_MAGIC, len(pages), len(indices),
+                                  len(names)))
+        for section in (names, name_offsets.tobytes(),
+                        indptr.astype(np.int32).tobytes(),
+                        indices.astype(np.int32).tobytes()):
+            f.write(section)
+            f.write(bytes(-len(section) % 8))
+
+
+def load_graph(path):
+    """
+    Memory-map a graph written by `save_graph`. The link arrays are read
+    from the page cache on demand, so several ranking jobs can share one
+    copy of a large graph.
+
+        Parameters:
+            path (str) : path of the binary graph file
+        Returns:
+            pages (list) : page names, indexed by their integer id
+
+            indptr (numpy.memmap) : out-links of page i are stored in
+            indices[indptr[i]:indptr[i + 1]]
+
+            indices (numpy.memmap) : integer ids of linked pages
+    """
+    with open(path, "rb") as f:
+        header = GRAPH_HEADER.unpack(f.read(GRAPH_HEADER.size))
+        magic, N, E, names_size = header
+        if magic != GRAPH_MAGIC:
+            raise ValueError(f"Not a PageRank graph file: {path}")
+        names = f.read(names_size)
+
+    offset = GRAPH_HEADER.size + names_size + (-names_size % 8)
+    name_offsets = np.memmap(path, dtype=np.int64, mode="r",
+                             offset=offset, shape=(N + 1,))
+    pages = [names[start:end].decode("utf-8")
+             for start, end in zip(name_offsets[:-1], name_offsets[1:])]
+
+    offset += name_offsets.nbytes
+    indptr = np.memmap(path, dtype=np.int32, mode="r",
+                       offset=offset, shape=(N + 1,))
+    offset += indptr.nbytes + (-indptr.nbytes % 8)
+    # numpy cannot map an empty section at the end of the file
+    indices = np.zeros(0, dtype=np.int32)
+    if E != 0:
+        indices = np.memmap(path, dtype=np.int32, mode="r",
+                            offset=offset, shape=(E,))
+    return pages, indptr, indices
+
+
+def graph_to_corpus(pages, indptr, indices):
+    """
+    Return the corpus dictionary, as produced by `crawl`, of a graph
+    loaded by `load_graph`.
+    """
+    return {page: {pages[j] for j in indices[indptr[i]:indptr[i + 1]]}
+            for i, page in enumerate(pages)}
+
+
+def iterate_pagerank_graph(path, damping_factor, tolerance=TOLERANCE,
+                           max_iterations=1000, method="power", stats=None):
+    """
+    Return PageRank values like `iterate_pagerank_sparse`, for a graph
+    file written by `save_graph`. The link arrays are memory-mapped and
+    used as the transition matrix without being copied.
+    """
+    pages, indptr, indices = load_graph(path)
+    matrix, dangling = graph_matrix(indptr, indices)
+    ranks = power_iteration(matrix, dangling, damping_factor, tolerance,
+                            max_iterations, method, stats)
+    return {page: float(ranks[i]) for i, page in enumerate(pages)}
+
+
+def sample_pagerank_graph(path, damping_factor, n, walkers=1024, seed=None):
+    """
+    Return PageRank values like `sample_pagerank_compiled`, for a graph
+    file written by `save_graph`, walking the memory-mapped link arrays.
+    """
+    pages, indptr, indices = load_graph(path)
+    if len(pages) == 0 or n <= 0:
+        return {}
+    rng = np.random.default_rng(seed)
+    counts = random_walk_counts(indptr, indices, damping_factor, n,
+                                walkers, rng)
+    return {page: int(counts[i]) / n for i, page in enumerate(pages)}
+
+
 # Helper Methods
 def get_probability(corpus, page, rank_dictionary):
     """
@@ -205,21 +609,559 @@ def check_convergence(prev_dict, next_dict):
             converged(bool) : True if converged False otherwise
     """
 
-    flags = []
-    converged = False
-    # loop through and check if diff of page rank distribution
-    # between previous and current iteration are <=0.001
-    for key in prev_dict:
-        diff = prev_dict[key] - next_dict[key]
-        if diff <= 0.001:
-            flags.append(1)
+    # check if the absolute diff of page rank distribution between
+    # previous and current iteration is <=0.001 for every page
+    return all(abs(prev_dict[key] - next_dict[key]) <= 0.001
+               for key in prev_dict)
+
+
+def extract_links(task):
+    """
+    Helper method that returns the set of pages an HTML file links to,
+    reading it `chunk_size` characters at a time. Anything after the last
+    `<` of a chunk may be an unfinished tag, so it is carried over to be
+    matched together with the next chunk.
+
+        Parameters:
+            task (tuple) : path of the HTML file and the chunk size
+        Returns:
+            links (set) : every href found, apart from the file itself
+    """
+    path, chunk_size = task
+    links = set()
+    carry = ""
+    with open(path) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            buffer = carry + chunk
+            if not chunk:
+                links.update(LINK_PATTERN.findall(buffer))
+                break
+            cut = buffer.rfind("<")
+            if cut == -1:
+                cut = len(buffer)
+            links.update(LINK_PATTERN.findall(buffer, 0, cut))
+            carry = buffer[cut:]
+    return links - {os.path.basename(path)}
+
+
+def load_link_index(index_path):
+    """
+    Helper method that loads the link index written by `save_link_index`,
+    or returns an empty one if there is none.
+    """
+    if index_path is None or not os.path.exists(index_path):
+        return dict()
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def save_link_index(index_path, index):
+    """
+    Helper method that writes the link index, mapping each file path to
+    its modification time, size and sorted links. The file is replaced
+    atomically so an interrupted crawl never leaves a broken index.
+    """
+    temp_path = index_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(temp_path, index_path)
+
+
+def apply_graph_changes(pages, indptr, indices, changes):
+    """
+    Helper method that applies the changes given to `update_pagerank` to a
+    table of out-links in CSR layout. Links to removed or unknown pages and
+    links from a page to itself are dropped, as in `build_sparse_graph`.
+
+        Returns:
+            pages (list) : the remaining pages in their previous order,
+            followed by the added pages
+
+            indptr (numpy.ndarray) : out-links of page i are stored in
+            indices[indptr[i]:indptr[i + 1]]
+
+            indices (numpy.ndarray) : integer ids of linked pages
+
+            kept (numpy.ndarray) : previous id of each remaining page
+    """
+    page_ids = dict(zip(pages, range(len(pages))))
+    N = len(pages)
+    removed = np.zeros(N, dtype=bool)
+    rewired = np.zeros(N, dtype=bool)
+    for page, links in changes.items():
+        if page in page_ids:
+            rewired[page_ids[page]] = True
+            removed[page_ids[page]] = links is None
+
+    kept = np.flatnonzero(~removed)
+    added = [page for page, links in changes.items()
+             if links is not None and page not in page_ids]
+    if len(kept) == N:
+        new_pages = list(pages) + added
+    else:
+        new_pages = [pages[i] for i in kept] + added
+        page_ids = dict(zip(new_pages, range(len(new_pages))))
+    page_ids.update((page, len(kept) + k) for k, page in enumerate(added))
+    M = len(new_pages)
+
+    # links of unchanged pages keep their order, renumbered without the
+    # removed pages and without links to them
+    renumber = np.full(N, -1, dtype=np.int64)
+    renumber[kept] = np.arange(len(kept))
+    out_degree = np.diff(indptr)
+    sources = np.repeat(renumber, out_degree)
+    targets = renumber[indices]
+    keep = (targets >= 0) & ~np.repeat(rewired, out_degree)
+    sources = sources[keep]
+    targets = targets[keep]
+
+    rows = {}
+    for page, links in changes.items():
+        if links is not None:
+            rows[page_ids[page]] = sorted({page_ids[link] for link in links
+                                           if link != page and link in page_ids})
+
+    kept_degree = np.bincount(sources, minlength=M)
+    degree = kept_degree.copy()
+    for i, row in rows.items():
+        degree[i] = len(row)
+    new_indptr = np.zeros(M + 1, dtype=indptr.dtype)
+    np.cumsum(degree, out=new_indptr[1:])
+    new_indices = np.empty(new_indptr[-1], dtype=indices.dtype)
+
+    # every kept link goes to the start of its page's row plus its position
+    # among that page's kept links
+    kept_start = np.zeros(M + 1, dtype=np.int64)
+    np.cumsum(kept_degree, out=kept_start[1:])
+    position = np.arange(len(sources)) - kept_start[sources]
+    new_indices[new_indptr[sources] + position] = targets
+    for i, row in rows.items():
+        new_indices[new_indptr[i]:new_indptr[i + 1]] = row
+
+    return new_pages, new_indptr, new_indices, kept
+
+
+def build_sparse_graph(corpus):
+    """
+    Helper method that converts the corpus into integer page ids and a
+    column-stochastic CSR transition matrix.
+
+        Parameters:
+            corpus (dict) : Python dictionary mapping a page name
+            to a set of all pages linked to it.
+        Returns:
+            pages (list) : page names, indexed by their integer id
+
+            matrix (scipy.sparse.csr_matrix) : N x N matrix where entry
+            (j, i) is 1 / NumLinks(i) if page i links to page j
+
+            dangling (numpy.ndarray) : boolean mask of pages with no links
+    """
+    pages = list(corpus.keys())
+    page_ids = {page: i for i, page in enumerate(pages)}
+    N = len(pages)
+
+    # build the edge list once; self links are ignored as in get_probability
+    sources = []
+    targets = []
+    for page, links in corpus.items():
+        i = page_ids[page]
+        for link in links:
+            if link != page and link in page_ids:
+                sources.append(i)
+                targets.append(page_ids[link])
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    out_degree = np.bincount(sources, minlength=N)
+    weights = 1 / out_degree[sources] if len(sources) else np.zeros(0)
+
+    matrix = sparse.csr_matrix((weights, (targets, sources)), shape=(N, N))
+    return pages, matrix, out_degree == 0
+
+
+def graph_matrix(indptr, indices):
+    """
+    Helper method that views an out-link table as the transition matrix of
+    `build_sparse_graph`. Out-links in CSR layout are the same arrays as
+    the transition matrix in CSC layout, so only the weights are new.
+
+        Returns:
+            matrix (scipy.sparse.csc_matrix) : N x N matrix where entry
+            (j, i) is 1 / NumLinks(i) if page i links to page j
+
+            dangling (numpy.ndarray) : boolean mask of pages with no links
+    """
+    N = len(indptr) - 1
+    out_degree = np.diff(indptr)
+    weights = np.repeat(1 / np.maximum(out_degree, 1), out_degree)
+    matrix = sparse.csc_matrix((weights, indices, indptr), shape=(N, N),
+                               copy=False)
+    return matrix, out_degree == 0
+
+
+def compile_transitions(corpus):
+    """
+    Helper method that compiles the corpus into a CSR table of out-links.
+
+        Parameters:
+            corpus (dict) : Python dictionary mapping a page name
+            to a set of all pages linked to it.
+        Returns:
+            pages (list) : page names, indexed by their integer id
+
+            indptr (numpy.ndarray) : out-links of page i are stored in
+            indices[indptr[i]:indptr[i + 1]]
+
+            indices (numpy.ndarray) : integer ids of linked pages
+    """
+    pages, matrix, _ = build_sparse_graph(corpus)
+    links = matrix.T.tocsr()
+    return pages, links.indptr, links.indices
+
+
+def random_walk_counts(indptr, indices, damping_factor, n, walkers, rng):
+    """
+    Helper method that draws `n` samples from `walkers` random surfers
+    advancing in lock step over a table built by `compile_transitions`.
+
+    With a single surfer the first page chosen at random is counted, as in
+    `sample_pagerank`. With several, each chain is short, so the surfers
+    first take enough unrecorded steps for the random start to be
+    forgotten; otherwise the start would bias the estimate.
+
+        Returns:
+            counts (numpy.ndarray) : number of visits to each page id
+    """
+    N = len(indptr) - 1
+    out_degree = np.diff(indptr)
+    counts = np.zeros(N, dtype=np.int64)
+
+    # first sample of every chain is a page chosen at random
+    current = rng.integers(N, size=max(1, min(walkers, n)))
+    if len(current) > 1 and 0 < damping_factor < 1:
+        burn_in = min(1000, int(np.ceil(np.log(1e-6) / np.log(damping_factor))))
+        for _ in range(burn_in):
+            current = walk_step(indptr, indices, out_degree, current,
+                                damping_factor, rng)
+
+    remaining = n
+    while True:
+        # the last batch only needs as many samples as are left
+        visited = current[:remaining]
+        counts += np.bincount(visited, minlength=N)
+        remaining -= len(visited)
+        if remaining <= 0:
+            break
+        current = walk_step(indptr, indices, out_degree, current,
+                            damping_factor, rng)
+
+    return counts
+
+
+def walk_step(indptr, indices, out_degree, current, damping_factor, rng):
+    """
+    Helper method that moves every surfer in `current` one step: follow a
+    link with probability `damping_factor`, otherwise (or from a page with
+    no links) jump to a page chosen at random.
+
+        Returns:
+            next_pages (numpy.ndarray) : the page id of each surfer
+    """
+    degree = out_degree[current]
+    follow = (rng.random(len(current)) < damping_factor) & (degree > 0)
+    next_pages = rng.integers(len(out_degree), size=len(current))
+    if follow.any():
+        offsets = rng.integers(degree[follow])
+        next_pages[follow] = indices[indptr[current[follow]] + offsets]
+    return next_pages
+
+
+def load_walk_table(indptr, indices):
+    """
+    Helper method run once in every walker process to keep the out-link
+    table in a global rather than sending it with each task.
+    """
+    global WALK_TABLE
+    WALK_TABLE = (indptr, indices)
+
+
+def walker_counts(task):
+    """
+    Helper method that runs one walker of `sample_pagerank_parallel`.
+
+        Parameters:
+            task (tuple) : damping factor, number of samples and the
+            numpy.random.SeedSequence of this walker's stream
+        Returns:
+            counts (numpy.ndarray) : number of visits to each page id
+    """
+    damping_factor, n, seed_sequence = task
+    indptr, indices = WALK_TABLE
+    if n <= 0:
+        return np.zeros(len(indptr) - 1, dtype=np.int64)
+    rng = np.random.default_rng(seed_sequence)
+    return random_walk_counts(indptr, indices, damping_factor, n, 1024, rng)
+
+
+def standard_errors(counts):
+    """
+    Helper method that estimates the standard error of each page's rank
+    from the spread of the per-walker estimates.
+
+        Parameters:
+            counts (numpy.ndarray) : walkers x pages matrix of visit counts
+        Returns:
+            errors (numpy.ndarray) : standard error for each page id, or
+            infinity when there are fewer than two walkers with samples
+    """
+    totals = counts.sum(axis=1)
+    estimates = counts[totals > 0] / totals[totals > 0, None]
+    if len(estimates) < 2:
+        return np.full(counts.shape[1], np.inf)
+    return estimates.std(axis=0, ddof=1) / np.sqrt(len(estimates))
+
+
+def power_iteration(matrix, dangling, damping_factor, tolerance=TOLERANCE,
+                    max_iterations=1000, method="power", stats=None):
+    """
+    Helper method that solves for the PageRank vector of a transition
+    matrix built by `build_sparse_graph` with one of the `SOLVERS`.
+    Pages without links spread their rank evenly over every page.
+
+        Returns:
+            ranks (numpy.ndarray) : PageRank value for each page id
+    """
+    if method not in SOLVERS:
+        raise ValueError(f"Unknown PageRank method: {method}")
+
+    start = time.perf_counter()
+    residuals = []
+    N = matrix.shape[0]
+    ranks = np.zeros(0)
+    if N != 0:
+        ranks = SOLVERS[method](matrix, dangling, damping_factor, tolerance,
+                                max_iterations, residuals)
+    if stats is not None:
+        record_stats(stats, method, residuals, start)
+    return ranks
+
+
+def batched_power_iteration(matrix, dangling, damping_factor, teleport,
+                            tolerance=TOLERANCE, max_iterations=1000):
+    """
+    Helper method that runs power iteration for every column of an N x K
+    `teleport` matrix together, so each iteration walks the graph once as
+    a sparse-matrix times dense-matrix product.
+
+        Returns:
+            ranks (numpy.ndarray) : N x K matrix of PageRank values, one
+            column per teleport distribution
+    """
+    teleport = np.asarray(teleport, dtype=float)
+    if teleport.ndim != 2 or teleport.shape[0] != matrix.shape[0]:
+        raise ValueError("Teleport matrix must have one row per page")
+    totals = teleport.sum(axis=0)
+    if np.any(totals <= 0) or np.any(teleport < 0):
+        raise ValueError("Teleport vectors must be non-negative and non-zero")
+    teleport = teleport / totals
+
+    ranks = teleport.copy()
+    for _ in range(max_iterations):
+        # rank of pages without links follows each column's teleport
+        dangling_mass = ranks[dangling].sum(axis=0)
+        jump = (1 - damping_factor) + damping_factor * dangling_mass
+        ranks_next = damping_factor * (matrix @ ranks) + teleport * jump
+        # every column must converge in L1 norm
+        converged = (np.abs(ranks_next - ranks).sum(axis=0).max()
+                     <= tolerance)
+        ranks = ranks_next
+        if converged:
+            break
+    return ranks
+
+
+def record_stats(stats, method, residuals, start):
+    """
+    Helper method that fills a `stats` dictionary with the convergence
+    history of a PageRank solver.
+    """
+    stats["method"] = method
+    stats["iterations"] = len(residuals)
+    stats["residuals"] = [float(r) for r in residuals]
+    stats["elapsed"] = time.perf_counter() - start
+
+
+def pagerank_step(matrix, dangling, damping_factor, ranks):
+    """
+    Helper method that applies one damped power iteration step, folding
+    the rank of pages without links into one scalar.
+    """
+    N = matrix.shape[0]
+    random_walk = (1 - damping_factor) / N
+    base = random_walk + damping_factor * ranks[dangling].sum() / N
+    return base + damping_factor * (matrix @ ranks)
+
+
+def solve_power(matrix, dangling, damping_factor, tolerance, max_iterations,
+                residuals, ranks=None):
+    """
+    Helper method for plain power iteration starting from `ranks`, or from
+    1 / N for every page if no ranks are given.
+    """
+    N = matrix.shape[0]
+    if ranks is None:
+        ranks = np.full(N, 1 / N)
+    for _ in range(max_iterations):
+        ranks_next = pagerank_step(matrix, dangling, damping_factor, ranks)
+        diff = np.abs(ranks_next - ranks)
+        residuals.append(diff.sum())
+        ranks = ranks_next
+        if residuals[-1] <= tolerance:
+            break
+    return ranks
+
+
+def solve_quadratic(matrix, dangling, damping_factor, tolerance,
+                    max_iterations, residuals, period=10):
+    """
+    Helper method for power iteration with quadratic extrapolation: after
+    `period` iterations the last four iterates are used to cancel the two
+    largest non-principal eigenvectors from the current estimate, if that
+    lowers the residual. Every rejected extrapolation doubles the number of
+    iterations until the next one.
+    """
+    history = []
+    wait = due = period
+    ranks = np.full(matrix.shape[0], 1 / matrix.shape[0])
+    for iteration in range(1, max_iterations + 1):
+        ranks_next = pagerank_step(matrix, dangling, damping_factor, ranks)
+        diff = np.abs(ranks_next - ranks)
+        residuals.append(diff.sum())
+        if residuals[-1] <= tolerance:
+            return ranks_next
+
+        history = (history + [ranks_next])[-4:]
+        ranks = ranks_next
+        if iteration == due and len(history) == 4:
+            x3, x2, x1, x0 = history
+            y = np.vstack([x2 - x3, x1 - x3])
+            # least squares through the 2x2 normal equations
+            gamma, *_ = np.linalg.lstsq(y @ y.T, y @ (x3 - x0), rcond=None)
+            gamma1, gamma2, gamma3 = gamma[0], gamma[1], 1.0
+            extrapolated = ((gamma1 + gamma2 + gamma3) * x2
+                            + (gamma2 + gamma3) * x1 + gamma3 * x0)
+            accepted = accept_extrapolation(matrix, dangling, damping_factor,
+                                            ranks, extrapolated, residuals)
+            # back off after a rejection, extrapolation is not paying here
+            if accepted is ranks:
+                wait *= 2
+            ranks = accepted
+            due = iteration + wait
+            history = []
+    return ranks
+
+
+def accept_extrapolation(matrix, dangling, damping_factor, ranks,
+                         extrapolated, residuals):
+    """
+    Helper method that returns the extrapolated ranks, clipped and
+    normalised, if one iteration from them moves less than one more
+    iteration from the current ranks is expected to; otherwise the current
+    ranks are kept.
+
+    Iterations are contracting by about rate = residuals[-1] / residuals[-2]
+    (at most damping_factor), so the current ranks are within about
+    rate / (1 - rate) times residuals[-1] of the solution. An extrapolation
+    moving them by more than twice that, or by less than a tenth of the
+    residual, is rejected without computing another iteration.
+    """
+    extrapolated = np.clip(extrapolated, 0, None, out=extrapolated)
+    total = extrapolated.sum()
+    if not np.isfinite(total) or total <= 0:
+        return ranks
+    extrapolated /= total
+
+    residual = residuals[-1]
+    rate = min(damping_factor, residual / residuals[-2])
+    change = np.abs(extrapolated - ranks).sum()
+    if change > 2 * rate / (1 - rate) * residual or change < residual / 10:
+        return ranks
+
+    proposed = pagerank_step(matrix, dangling, damping_factor, extrapolated)
+    if np.abs(proposed - extrapolated).sum() < rate * residual:
+        return extrapolated
+    return ranks
+
+
+def local_power_iteration(indptr, indices, damping_factor, ranks, tolerance,
+                          max_iterations):
+    """
+    Helper method that converges warm-started ranks by updating only the
+    pages that are not converged. It keeps the residual of every page, how
+    far one more step would move it, and moves each active page by its
+    residual, which passes a share of that change on to its links. Pages
+    with no links pass theirs to every page, which is kept as one scalar.
+
+    Once more than LOCAL_UPDATE_FRACTION of the pages are active, the rest
+    of the work is left to `solve_power`, started from the current ranks.
+
+        Returns:
+            ranks (numpy.ndarray) : PageRank value for each page id
+    """
+    N = len(indptr) - 1
+    matrix, dangling = graph_matrix(indptr, indices)
+    out_degree = np.diff(indptr)
+    ranks = ranks.copy()
+    residual = pagerank_step(matrix, dangling, damping_factor, ranks) - ranks
+
+    # pages at most `threshold` off, and the shared residual if it is at most
+    # tolerance / 2 in total, leave the L1 residual within the tolerance
+    threshold = tolerance / (2 * N)
+    shared = 0.0
+    active = np.flatnonzero(np.abs(residual) > threshold)
+    for _ in range(max_iterations):
+        if len(active) == 0:
+            break
+        if len(active) > LOCAL_UPDATE_FRACTION * N:
+            ranks += residual + shared
+            ranks /= ranks.sum()
+            return solve_power(matrix, dangling, damping_factor, tolerance,
+                               max_iterations, [], ranks)
+
+        push = residual[active]
+        ranks[active] += push
+        residual[active] = 0
+        counts = out_degree[active]
+        shared += damping_factor * push[counts == 0].sum() / N
+
+        # out-links of every active page, in one gather
+        ends = np.cumsum(counts)
+        links = indices[np.repeat(indptr[active] - ends + counts, counts)
+                        + np.arange(ends[-1] if len(ends) else 0)]
+        np.add.at(residual, links,
+                  np.repeat(damping_factor * push / np.maximum(counts, 1),
+                            counts))
+
+        if N * abs(shared) > tolerance / 2:
+            residual += shared
+            shared = 0.0
+            active = np.flatnonzero(np.abs(residual) > threshold)
         else:
-            flags.append(0)
-    # check for convergence
-    if sum(flags) == len(prev_dict.keys()):
-        converged = True
-    return converged
+            links = np.unique(links)
+            active = links[np.abs(residual[links]) > threshold]
+
+    # one last step, which every page is already within its residual of
+    ranks += residual + shared
+    ranks /= ranks.sum()
+    return ranks
+
 
+SOLVERS = {
+    "power": solve_power,
+    "quadratic": solve_quadratic,
+}
 
 if __name__ == "__main__":
     main()
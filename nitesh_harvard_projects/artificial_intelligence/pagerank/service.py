@@ -0,0 +1,320 @@
+import argparse
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import pagerank
+
+CACHE_SIZE = 16
+
+# seconds between checks of the served corpus directories for changes;
+# queries use the fingerprint from the last check
+REFRESH_INTERVAL = 5.0
+
+# rankings are converged to this L1 tolerance, and ranks closer than
+# TOLERANCE / 100 are treated as ties so that rounding noise between
+# tied pages does not move them
+TOLERANCE = 1e-10
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve PageRank queries over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="L1 convergence tolerance of the rankings")
+    parser.add_argument("--refresh", type=float, default=REFRESH_INTERVAL,
+                        help="seconds between checks for corpus changes")
+    args = parser.parse_args()
+
+    service = RankingService(args.cache_size, args.tolerance)
+    service.start_refresh(args.refresh)
+    server = ThreadingHTTPServer((args.host, args.port),
+                                 request_handler(service))
+    print(f"Serving PageRank queries on http://{args.host}:{args.port}")
+    print("  /top?corpus=DIR&k=10  /rank?corpus=DIR&page=PAGE  "
+          "/percentile?corpus=DIR&page=PAGE  (optional &damping=0.85)")
+    print("  /reload?corpus=DIR  to pick up changes before the next check")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+class RankIndex():
+    """
+    PageRank values of one corpus, sorted once so that queries are
+    answered by lookup instead of by ranking again. Ranks are compared
+    after rounding to a multiple of `resolution`, if given.
+    """
+
+    def __init__(self, ranks, resolution=None):
+
+        # Ranks as compared, equal for pages tied up to the resolution
+        levels = ranks
+        if resolution:
+            levels = {page: round(rank / resolution)
+                      for page, rank in ranks.items()}
+
+        # Pages from highest to lowest PageRank, ties broken by name
+        self.pages = sorted(ranks, key=lambda page: (-levels[page], page))
+        self.ranks = ranks
+        self.levels = levels
+
+        # Position of every page in the ordering, starting at 1
+        self.positions = {page: i + 1 for i, page in enumerate(self.pages)}
+
+        # PageRank values in ascending order for percentile queries
+        self.ascending = np.sort(np.fromiter(levels.values(), dtype=float,
+                                             count=len(ranks)))
+
+    def __len__(self):
+        return len(self.pages)
+
+    def top(self, k):
+        """
+        Returns a list of the `k` highest ranked (page, PageRank) pairs.
+        """
+        return [(page, self.ranks[page]) for page in self.pages[:k]]
+
+    def rank_of(self, page):
+        """
+        Returns the position of `page` in the ranking, 1 being the highest.
+        """
+        return self.positions[page]
+
+    def percentile(self, page):
+        """
+        Returns the percentage of pages with a lower PageRank than `page`.
+        """
+        lower = np.searchsorted(self.ascending, self.levels[page],
+                                side="left")
+        return 100 * int(lower) / len(self.pages)
+
+
+class RankingService():
+    """
+    In-process PageRank query API. Corpora are crawled and ranked once,
+    to an L1 `tolerance` tight enough for positions and percentiles to be
+    stable, and the ranked index is kept in an LRU cache keyed by the
+    corpus fingerprint, damping factor and tolerance, so repeated queries
+    are lookups.
+
+    The fingerprint of a directory is taken when it is first queried and
+    then only by `reload`, which `start_refresh` calls periodically, so
+    queries never scan the directory.
+    """
+
+    def __init__(self, cache_size=CACHE_SIZE, tolerance=TOLERANCE):
+        self.cache_size = cache_size
+        self.tolerance = tolerance
+        self.cache = collections.OrderedDict()
+        self.fingerprints = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def index(self, directory, damping_factor=pagerank.DAMPING):
+        """
+        Returns the RankIndex of the corpus in `directory`, ranking it only
+        if no cached index matches its files as of the last check.
+        """
+        directory = os.path.abspath(directory)
+        with self.lock:
+            fingerprint = self.fingerprints.get(directory)
+        if fingerprint is None:
+            fingerprint = self.reload(directory)[directory]
+
+        key = (fingerprint, damping_factor, self.tolerance)
+        with self.lock:
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            self.misses += 1
+
+        corpus = pagerank.crawl_parallel(directory)
+        index = RankIndex(pagerank.iterate_pagerank_sparse(
+            corpus, damping_factor, self.tolerance), self.tolerance / 100)
+        self.store(key, index)
+        return index
+
+    def corpus_index(self, corpus, damping_factor=pagerank.DAMPING):
+        """
+        Returns the RankIndex of an in-memory corpus, ranking it only if no
+        cached index has the same pages and links.
+        """
+        key = (corpus_fingerprint(corpus), damping_factor, self.tolerance)
+        with self.lock:
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            self.misses += 1
+
+        index = RankIndex(pagerank.iterate_pagerank_sparse(
+            corpus, damping_factor, self.tolerance), self.tolerance / 100)
+        self.store(key, index)
+        return index
+
+    def reload(self, directory=None):
+        """
+        Checks `directory`, or every directory queried so far, for changes
+        now instead of at the next periodic check. Returns a dictionary
+        mapping each directory checked to its new fingerprint.
+
+        Directories queried so far that can no longer be read are forgotten,
+        so that their next query fails instead of using a stale index.
+        """
+        if directory is not None:
+            directory = os.path.abspath(directory)
+            fingerprints = {directory: directory_fingerprint(directory)}
+            with self.lock:
+                self.fingerprints.update(fingerprints)
+            return fingerprints
+
+        with self.lock:
+            directories = list(self.fingerprints)
+        fingerprints = {}
+        for directory in directories:
+            try:
+                fingerprints[directory] = directory_fingerprint(directory)
+            except OSError:
+                with self.lock:
+                    self.fingerprints.pop(directory, None)
+        with self.lock:
+            self.fingerprints.update(fingerprints)
+        return fingerprints
+
+    def start_refresh(self, interval=REFRESH_INTERVAL):
+        """
+        Starts a daemon thread that calls `reload` every `interval` seconds,
+        so that changed corpora are ranked again without any query having
+        to check for changes.
+        """
+        def refresh():
+            while True:
+                time.sleep(interval)
+                self.reload()
+
+        thread = threading.Thread(target=refresh, daemon=True)
+        thread.start()
+        return thread
+
+    def store(self, key, index):
+        """
+        Adds an index to the cache, evicting the least recently used one
+        when the cache is full.
+        """
+        with self.lock:
+            self.cache[key] = index
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def top(self, directory, k, damping_factor=pagerank.DAMPING):
+        return self.index(directory, damping_factor).top(k)
+
+    def rank_of(self, directory, page, damping_factor=pagerank.DAMPING):
+        return self.index(directory, damping_factor).rank_of(page)
+
+    def percentile(self, directory, page, damping_factor=pagerank.DAMPING):
+        return self.index(directory, damping_factor).percentile(page)
+
+
+def directory_fingerprint(directory):
+    """
+    Returns a fingerprint of the HTML files in `directory` built from their
+    names, modification times and sizes, so it changes whenever a page is
+    added, removed or edited without reading any page.
+    """
+    digest = hashlib.sha256()
+    digest.update(os.path.abspath(directory).encode("utf-8"))
+    with os.scandir(directory) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            if not entry.name.endswith(".html") or not entry.is_file():
+                continue
+            stat = entry.stat()
+            digest.update(f"{entry.name}\0{stat.st_mtime_ns}\0"
+                          f"{stat.st_size}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def corpus_fingerprint(corpus):
+    """
+    Returns a fingerprint of the pages and links of an in-memory corpus.
+    """
+    digest = hashlib.sha256()
+    for page in sorted(corpus):
+        digest.update(page.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update("\0".join(sorted(corpus[page])).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def request_handler(service):
+    """
+    Returns an HTTP request handler class answering JSON queries with
+    `service`.
+    """
+
+    class RankingHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[-1]
+                     for key, values in parse_qs(url.query).items()}
+            try:
+                directory = query["corpus"]
+                damping_factor = float(query.get("damping", pagerank.DAMPING))
+                if url.path == "/top":
+                    top = service.top(directory, int(query.get("k", 10)),
+                                      damping_factor)
+                    body = [{"page": page, "rank": rank} for page, rank in top]
+                elif url.path == "/rank":
+                    body = {"page": query["page"],
+                            "position": service.rank_of(
+                                directory, query["page"], damping_factor)}
+                elif url.path == "/percentile":
+                    body = {"page": query["page"],
+                            "percentile": service.percentile(
+                                directory, query["page"], damping_factor)}
+                elif url.path == "/reload":
+                    service.reload(directory)
+                    body = {"corpus": directory}
+                else:
+                    self.respond(404, {"error": f"Unknown query: {url.path}"})
+                    return
+            except KeyError as error:
+                self.respond(400, {"error": f"Missing or unknown {error}"})
+                return
+            except (ValueError, OSError) as error:
+                self.respond(400, {"error": str(error)})
+                return
+            self.respond(200, body)
+
+        def respond(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return RankingHandler
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import sys
+
+import tictactoe as ttt
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else ttt.BOOK_PATH
+    solved = ttt.build_opening_book(path)
+    print(f"Solved {solved} positions, opening book written to {path}")
@@ -0,0 +1,237 @@
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import random
+import statistics
+import time
+
+import tictactoe as ttt
+
+# Agents known to play perfectly on the 3 x 3 board
+PERFECT_AGENTS = {"full", "alphabeta", "book"}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play tic-tac-toe agents against each other headlessly.")
+    parser.add_argument("--x", nargs="+", default=["book"], choices=AGENTS,
+                        help="agents playing X")
+    parser.add_argument("--o", nargs="+", default=["random"], choices=AGENTS,
+                        help="agents playing O")
+    parser.add_argument("--games", type=int, default=1000,
+                        help="games per pairing of an X and an O agent")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rows", type=int, default=ttt.ROW)
+    parser.add_argument("--columns", type=int, default=ttt.COLUMN)
+    parser.add_argument("--k", type=int, default=ttt.TOTAL_TO_WIN)
+    parser.add_argument("--time-limit", type=float, default=0.1,
+                        help="seconds per move of the deepening agent")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    tasks = [(x_agent, o_agent, args.seed * 1000003 + game, args.rows,
+              args.columns, args.k, args.time_limit)
+             for x_agent, o_agent in itertools.product(args.x, args.o)
+             for game in range(args.games)]
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        games = list(pool.imap_unordered(play_game, tasks,
+                                         chunksize=max(1, len(tasks) // 256)))
+    elapsed = time.perf_counter() - start
+
+    report = summarize(games, elapsed, args.rows, args.columns, args.k)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def random_agent(board, rng, time_limit):
+    """
+    Plays a move chosen uniformly at random.
+    """
+    return rng.choice(sorted(ttt.actions(board)))
+
+
+def full_agent(board, rng, time_limit):
+    """
+    Plays the first best move found by the full minimax search without
+    pruning, using max_value and min_value.
+    """
+    ttt.search_stats["nodes"] = 1
+    maximizing = ttt.player(board) == ttt.X
+    best_action = None
+    best_val = -math.inf if maximizing else math.inf
+    for action in sorted(ttt.actions(board)):
+        if maximizing:
+            v = ttt.min_value(ttt.result(board, action))
+            if v > best_val:
+                best_val, best_action = v, action
+        else:
+            v = ttt.max_value(ttt.result(board, action))
+            if v < best_val:
+                best_val, best_action = v, action
+    return best_action
+
+
+def alphabeta_agent(board, rng, time_limit):
+    """
+    Plays the move found by alpha-beta search with the transposition
+    table, without the opening book.
+    """
+    return ttt.search(board)
+
+
+def book_agent(board, rng, time_limit):
+    """
+    Plays the move of minimax, which uses the opening book when it can.
+    """
+    return ttt.minimax(board)
+
+
+def deepening_agent(board, rng, time_limit):
+    """
+    Plays the move of an iterative deepening search within the time limit.
+    """
+    return ttt.iterative_deepening(board, time_limit)
+
+
+AGENTS = {
+    "random": random_agent,
+    "full": full_agent,
+    "alphabeta": alphabeta_agent,
+    "book": book_agent,
+    "deepening": deepening_agent,
+}
+
+
+def play_game(task):
+    """
+    Plays one game and returns its result with the time and the number
+    of search nodes of every move. On the 3 x 3 board every move of an
+    agent in PERFECT_AGENTS that lowers the value of the position for
+    its player, such as drawing a won position, counts as a mistake.
+    """
+    x_agent, o_agent, seed, rows, columns, k, time_limit = task
+    rng = random.Random(seed)
+    agents = {ttt.X: x_agent, ttt.O: o_agent}
+    moves = {ttt.X: [], ttt.O: []}
+    mistakes = {ttt.X: 0, ttt.O: 0}
+    checked = (rows, columns, k) == (3, 3, 3)
+
+    board = ttt.LineState(rows=rows, columns=columns, k=k)
+    while not ttt.terminal(board):
+        turn = ttt.player(board)
+        ttt.search_stats["nodes"] = 0
+        start = time.perf_counter()
+        action = AGENTS[agents[turn]](board, rng, time_limit)
+        seconds = time.perf_counter() - start
+        moves[turn].append((seconds, ttt.search_stats["nodes"]))
+        after = ttt.result(board, action)
+        if (checked and agents[turn] in PERFECT_AGENTS
+                and position_value(after) != position_value(board)):
+            mistakes[turn] += 1
+        board = after
+
+    return {
+        "x": x_agent,
+        "o": o_agent,
+        "utility": ttt.utility(board),
+        "moves": moves,
+        "mistakes": mistakes,
+    }
+
+
+def position_value(board):
+    """
+    Returns the minimax value of a 3 x 3 board, from the opening book if
+    it has been built.
+    """
+    entry = ttt.book_lookup(board)
+    if entry is not None:
+        return entry[1]
+    return ttt.alpha_beta(board, -math.inf, math.inf)
+
+
+def summarize(games, elapsed, rows, columns, k):
+    """
+    Returns the report of a batch of games: throughput, win/draw/loss
+    counts of every pairing, per-agent move latency and search nodes, and
+    the mistakes of perfect agents on the 3 x 3 board.
+    """
+    pairings = {}
+    latencies = {}
+    nodes = {}
+    imperfect = 0
+    for game in games:
+        key = f"{game['x']} (X) vs {game['o']} (O)"
+        counts = pairings.setdefault(key, {"X wins": 0, "draws": 0,
+                                           "O wins": 0})
+        if game["utility"] == 1:
+            counts["X wins"] += 1
+        elif game["utility"] == -1:
+            counts["O wins"] += 1
+        else:
+            counts["draws"] += 1
+
+        for turn, agent in ((ttt.X, game["x"]), (ttt.O, game["o"])):
+            for seconds, searched in game["moves"][turn]:
+                latencies.setdefault(agent, []).append(seconds)
+                nodes.setdefault(agent, []).append(searched)
+
+        imperfect += game["mistakes"][ttt.X] + game["mistakes"][ttt.O]
+
+    agents = {}
+    for agent, seconds in latencies.items():
+        ordered = sorted(seconds)
+        agents[agent] = {
+            "moves": len(ordered),
+            "mean_move_ms": 1000 * statistics.mean(ordered),
+            "p99_move_ms": 1000 * ordered[min(len(ordered) - 1,
+                                              int(0.99 * len(ordered)))],
+            "mean_nodes": statistics.mean(nodes[agent]),
+        }
+
+    return {
+        "board": {"rows": rows, "columns": columns, "k": k},
+        "games": len(games),
+        "seconds": elapsed,
+        "games_per_second": len(games) / elapsed if elapsed else 0,
+        "pairings": pairings,
+        "agents": agents,
+        "perfect_play_mistakes": imperfect,
+    }
+
+
+def print_report(report):
+    """
+    Prints a report from summarize as text tables.
+    """
+    board = report["board"]
+    print(f"{report['games']} games on a {board['rows']}x{board['columns']} "
+          f"board, {board['k']} in a row, in {report['seconds']:.2f}s "
+          f"({report['games_per_second']:.1f} games/s)")
+    print()
+    print(f"{'pairing':<36}{'X wins':>8}{'draws':>8}{'O wins':>8}")
+    for pairing, counts in sorted(report["pairings"].items()):
+        print(f"{pairing:<36}{counts['X wins']:>8}{counts['draws']:>8}"
+              f"{counts['O wins']:>8}")
+    print()
+    print(f"{'agent':<12}{'moves':>8}{'mean ms':>10}{'p99 ms':>10}"
+          f"{'mean nodes':>12}")
+    for agent, stats in sorted(report["agents"].items()):
+        print(f"{agent:<12}{stats['moves']:>8}{stats['mean_move_ms']:>10.3f}"
+              f"{stats['p99_move_ms']:>10.3f}{stats['mean_nodes']:>12.1f}")
+    if report["perfect_play_mistakes"]:
+        print()
+        print(f"WARNING: perfect agents made "
+              f"{report['perfect_play_mistakes']} moves worse than the "
+              f"book's")
+
+
+if __name__ == "__main__":
+    main()
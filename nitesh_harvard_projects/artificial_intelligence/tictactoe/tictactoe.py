@@ -3,7 +3,12 @@ Tic Tac Toe Player
 """
 
 import math
-import copy
+import functools
+import mmap
+import multiprocessing
+import os
+import queue
+import time
 
 X = "X"
 O = "O"
@@ -12,20 +17,232 @@ ROW = 3
 COLUMN = 3
 TOTAL_TO_WIN = 3
 
-
-def initial_state():
+# Directions of the winning lines: across, down and the two diagonals
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+# Number of nodes visited and transposition table hits of the last search
+search_stats = {"nodes": 0, "table_hits": 0}
+
+# Values of positions searched so far, kept for the life of the process.
+# Keyed by the canonical form of the board, each entry holds the value
+# and whether it is EXACT or only a LOWER or UPPER bound.
+transposition_table = {}
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Small integer code of each cell value in a canonical board encoding
+CELL_CODE = {EMPTY: 0, X: 1, O: 2}
+
+# Opening book of the 3 x 3 game, built by build_book.py. It holds one
+# byte per base 3 board code: the cell index of the optimal action in the
+# low 4 bits (NO_ACTION on terminal boards) and the minimax value + 1 in
+# the high 4 bits, or BOOK_MISSING for unreachable boards. It is mapped
+# into memory the first time minimax needs it.
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         "opening_book.bin")
+NO_ACTION = 0x0F
+BOOK_MISSING = 0xFF
+opening_book = None
+
+# Best-so-far bounds of the root searches running on a SearchPool, shared
+# with its worker processes: two values per slot, the best score found for
+# the player to move and the index of its action. Set in every worker by
+# init_search_worker.
+shared_bounds = None
+shared_lock = None
+
+
+def initial_state(rows=ROW, columns=COLUMN):
     """
     Returns starting state of the board.
     """
-    return [[EMPTY, EMPTY, EMPTY],
-            [EMPTY, EMPTY, EMPTY],
-            [EMPTY, EMPTY, EMPTY]]
+    return [[EMPTY] * columns for _ in range(rows)]
+
+
+class Bitboard():
+    """
+    Compact board state: one integer bit mask for the cells taken by X and
+    one for the cells taken by O, with cell (i, j) at bit i * columns + j.
+    Every function of this module also accepts a Bitboard in place of the
+    nested list board. Unlike a list board, which is won with TOTAL_TO_WIN
+    in a row unless the search is given another k, a Bitboard carries its
+    own k.
+    """
+
+    __slots__ = ("x", "o", "rows", "columns", "k")
+
+    def __init__(self, x=0, o=0, rows=ROW, columns=COLUMN, k=None):
+        self.x = x
+        self.o = o
+        self.rows = rows
+        self.columns = columns
+        self.k = TOTAL_TO_WIN if k is None else k
+
+    @classmethod
+    def from_board(cls, board, k=None):
+        """
+        Returns the Bitboard of a nested list board.
+        """
+        x = 0
+        o = 0
+        columns = len(board[0])
+        for i, row in enumerate(board):
+            for j, cell in enumerate(row):
+                if cell == X:
+                    x |= 1 << (i * columns + j)
+                elif cell == O:
+                    o |= 1 << (i * columns + j)
+        return cls(x, o, len(board), columns, k)
+
+    def to_board(self):
+        """
+        Returns the board in the nested list format.
+        """
+        return [list(self[i]) for i in range(self.rows)]
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.rows:
+            raise IndexError("Bitboard row out of range")
+        row = []
+        for j in range(self.columns):
+            bit = 1 << (i * self.columns + j)
+            row.append(X if self.x & bit else O if self.o & bit else EMPTY)
+        return row
+
+    def __len__(self):
+        return self.rows
+
+    def __eq__(self, other):
+        return (isinstance(other, Bitboard) and self.x == other.x
+                and self.o == other.o and self.rows == other.rows
+                and self.columns == other.columns)
+
+    def __hash__(self):
+        return hash((self.x, self.o, self.rows, self.columns))
+
+    def __repr__(self):
+        return f"Bitboard({self.to_board()})"
+
+    def cells(self):
+        """
+        Returns the CELL_CODE of every cell in row order.
+        """
+        return tuple(1 if self.x >> k & 1 else 2 if self.o >> k & 1 else 0
+                     for k in range(self.rows * self.columns))
+
+    def player(self):
+        if bin(self.o).count("1") < bin(self.x).count("1"):
+            return O
+        return X
+
+    def actions(self):
+        taken = self.x | self.o
+        return set(divmod(k, self.columns)
+                   for k in range(self.rows * self.columns)
+                   if not taken >> k & 1)
+
+    def result(self, action):
+        bit = 1 << (action[0] * self.columns + action[1])
+        if (self.x | self.o) & bit:
+            raise ValueError(f"Cell {action} is already taken")
+        if self.player() == X:
+            return Bitboard(self.x | bit, self.o, self.rows, self.columns,
+                            self.k)
+        return Bitboard(self.x, self.o | bit, self.rows, self.columns, self.k)
+
+    def winner(self):
+        for mask in win_masks(self.rows, self.columns, self.k):
+            if self.x & mask == mask:
+                return X
+            if self.o & mask == mask:
+                return O
+        return None
+
+    def terminal(self):
+        full = (1 << (self.rows * self.columns)) - 1
+        return (self.x | self.o) == full or self.winner() is not None
+
+
+class LineState(Bitboard):
+    """
+    Bitboard that also keeps the winner, the number of empty cells and the
+    line score of `line_heuristic`. A move only looks at the winning lines
+    through its cell, so the winner, the end of the game and the heuristic
+    are known without rescanning the board, and since none of this is
+    stored per line, a new state shares nothing with the old one and costs
+    time in the lines through the cell rather than in all lines.
+    """
+
+    __slots__ = ("empty", "game_winner", "line_score")
+
+    def __init__(self, x=0, o=0, rows=ROW, columns=COLUMN, k=None):
+        super().__init__(x, o, rows, columns, k)
+        self.empty = self.rows * self.columns - bin(x | o).count("1")
+        self.game_winner = Bitboard.winner(self)
+        self.line_score = sum(line_value(x & mask, o & mask)
+                              for mask in win_masks(self.rows, self.columns,
+                                                    self.k))
+
+    def player(self):
+        if (self.rows * self.columns - self.empty) % 2:
+            return O
+        return X
+
+    def result(self, action):
+        cell = action[0] * self.columns + action[1]
+        bit = 1 << cell
+        if (self.x | self.o) & bit:
+            raise ValueError(f"Cell {action} is already taken")
+
+        turn = self.player()
+        if turn == X:
+            mine, theirs, sign = self.x, self.o, 1
+        else:
+            mine, theirs, sign = self.o, self.x, -1
+
+        # Only the lines through the new mark change, and only they can
+        # have been completed
+        game_winner = self.game_winner
+        score = self.line_score
+        for mask in cell_masks(self.rows, self.columns, self.k)[cell]:
+            mine_count = bin(mine & mask).count("1")
+            their_count = bin(theirs & mask).count("1")
+            if their_count == 0:
+                score += sign * (2 * mine_count + 1)
+            elif mine_count == 0:
+                score += sign * their_count ** 2
+            if mine_count + 1 == self.k:
+                game_winner = turn
+
+        new_state = LineState.__new__(LineState)
+        new_state.rows = self.rows
+        new_state.columns = self.columns
+        new_state.k = self.k
+        if turn == X:
+            new_state.x = self.x | bit
+            new_state.o = self.o
+        else:
+            new_state.x = self.x
+            new_state.o = self.o | bit
+        new_state.empty = self.empty - 1
+        new_state.game_winner = game_winner
+        new_state.line_score = score
+        return new_state
+
+    def winner(self):
+        return self.game_winner
+
+    def terminal(self):
+        return self.empty == 0 or self.game_winner is not None
 
 
 def player(board):
     """
     Returns player who has the next turn on a board.
     """
+    if isinstance(board, Bitboard):
+        return board.player()
     x_count = sum([a.count(X) for a in board])
     o_count = sum([a.count(O) for a in board])
     if o_count < x_count:
@@ -37,9 +254,11 @@ def actions(board):
     """
     Returns set of all possible actions (i, j) available on the board.
     """
+    if isinstance(board, Bitboard):
+        return board.actions()
     action_list = set()
-    for row in range(ROW):
-        for col in range(COLUMN):
+    for row in range(len(board)):
+        for col in range(len(board[0])):
             if board[row][col] is None:
                 action_list.add((row, col))
     return action_list
@@ -49,7 +268,9 @@ def result(board, action):
     """
     Returns the board that results from making move (i, j) on the board.
     """
-    new_board = copy.deepcopy(board)
+    if isinstance(board, Bitboard):
+        return board.result(action)
+    new_board = [row[:] for row in board]
     new_board[action[0]][action[1]] = player(board)
     return new_board
 
@@ -58,6 +279,8 @@ def winner(board):
     """
     Returns the winner of the game, if there is one.
     """
+    if isinstance(board, Bitboard):
+        return board.winner()
     # check if there is a winner horizontally
     game_winner = check_row_winner(board)
     if game_winner is not None:
@@ -80,6 +303,8 @@ def terminal(board):
     """
     Returns True if game is over, False otherwise.
     """
+    if isinstance(board, Bitboard):
+        return board.terminal()
     if sum([a.count(None) for a in board]) == 0 or winner(board) is not None:
         return True
     else:
@@ -99,54 +324,177 @@ def utility(board):
         return 0
 
 
-def minimax(board):
+def minimax(board, pool=None, k=None):
     """
     Returns the optimal action for the current player on the board.
+    If a SearchPool is given, the root moves are searched in parallel.
+    A list board is won with `k` in a row if given, TOTAL_TO_WIN if not.
     """
+    board = with_k(board, k)
     if terminal(board):
         return None
 
-    my_list = []
-    index = 0
-    # Get the best move for the X player that gives the max number
-    if player(board) == X:
-        for action in actions(board):
-            v = min_value(result(board, action))
-            # If an optimum value is found return the action immediately
-            if v == 1:
-                return action
-            my_list.append((v, action))
-
-        # From the list of value and actions find the action with max value
-        max_val = my_list[0][0]
-        for i in range(len(my_list)):
-            if my_list[i][0] >= max_val:
-                max_val = my_list[i][0]
-                index = i
-        return my_list[index][1]
-
-    # Get the best move for the O player that gives the min number
+    entry = book_lookup(board)
+    if entry is not None:
+        search_stats["nodes"] = 0
+        search_stats["table_hits"] = 0
+        return entry[0]
+    if pool is not None:
+        return pool.search(board)
+    return search(board)
+
+
+def search(board, k=None):
+    """
+    Returns the optimal action for the current player on a non-terminal
+    board by alpha-beta search, without consulting the opening book.
+    A list board is won with `k` in a row if given, TOTAL_TO_WIN if not.
+    """
+    board = with_k(board, k)
+    search_stats["nodes"] = 1
+    search_stats["table_hits"] = 0
+    maximizing = player(board) == X
+    best_action = None
+    best_val = -math.inf if maximizing else math.inf
+    alpha = -math.inf
+    beta = math.inf
+
+    # Search the most promising moves first so the bounds tighten early
+    for action in ordered_actions(board):
+        v = alpha_beta(result(board, action), alpha, beta)
+        if maximizing and v > best_val:
+            best_val, best_action = v, action
+            alpha = max(alpha, v)
+        elif not maximizing and v < best_val:
+            best_val, best_action = v, action
+            beta = min(beta, v)
+        # If an optimum value is found return the action immediately
+        if best_val == (1 if maximizing else -1):
+            break
+    return best_action
+
+
+class SearchPool():
+    """
+    Process pool that searches the root moves of a board in parallel, for
+    boards and depths too large to search one move after another.
+
+    Each root move is searched by a worker with a window narrowed by the
+    best score any worker has found so far for that search, kept in shared
+    memory. Scores are compared as (score, earlier action), so the chosen
+    action is the first one in `ordered_actions` order with the best
+    value, the same action the serial search returns, however the work is
+    scheduled. Up to `slots` searches, e.g. of different games, can share
+    one pool at a time.
+    """
+
+    def __init__(self, processes=None, slots=64):
+        bounds = multiprocessing.RawArray("d", 2 * slots)
+        lock = multiprocessing.Lock()
+        self.bounds = bounds
+        self.lock = lock
+        self.free = queue.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.pool = multiprocessing.Pool(processes, init_search_worker,
+                                         (bounds, lock))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def search(self, board, depth=None, heuristic=None, k=None):
+        """
+        Returns the optimal action for the current player on a non-terminal
+        board, or with `depth` the best action of a search cut off after
+        that many moves and scored by `heuristic` as in
+        `iterative_deepening`. A list board is won with `k` in a row if
+        given, TOTAL_TO_WIN if not.
+        """
+        # workers get a LineState, which tells them k
+        board = with_k(board, k)
+        moves = ordered_actions(board)
+        sign = 1 if player(board) == X else -1
+
+        slot = self.free.get()
+        try:
+            with self.lock:
+                self.bounds[2 * slot] = -math.inf
+                self.bounds[2 * slot + 1] = len(moves)
+            tasks = [(slot, index, result(board, action), sign, depth,
+                      heuristic) for index, action in enumerate(moves)]
+            results = self.pool.map(root_move_value, tasks, chunksize=1)
+        finally:
+            self.free.put(slot)
+
+        # Best score, then earliest action, whatever order workers finished
+        index, _, _ = max(results, key=lambda r: (r[1], -r[0]))
+        search_stats["nodes"] = 1 + sum(nodes for _, _, nodes in results)
+        search_stats["table_hits"] = 0
+        return moves[index]
+
+
+def init_search_worker(bounds, lock):
+    """
+    Stores the shared bounds and their lock in a SearchPool worker.
+    """
+    global shared_bounds, shared_lock
+    shared_bounds = bounds
+    shared_lock = lock
+
+
+def root_move_value(task):
+    """
+    Returns (index, score, nodes) for one root move of a SearchPool search.
+    The score is from the point of view of the player making the move, and
+    is exact if the move beats the best-so-far bound it was searched
+    against, or else an upper bound that cannot beat it.
+    """
+    slot, index, board, sign, depth, heuristic = task
+    search_stats["nodes"] = 0
+
+    with shared_lock:
+        bound = shared_bounds[2 * slot]
+        bound_index = shared_bounds[2 * slot + 1]
+
+    # An earlier action with the best possible value cannot be beaten
+    if depth is None and bound >= 1 and bound_index < index:
+        return index, -math.inf, 0
+
+    # Ties go to the earlier action, so a later one must score higher
+    floor = bound if bound_index < index else math.nextafter(bound, -math.inf)
+    if sign == 1:
+        alpha, beta = floor, math.inf
+    else:
+        alpha, beta = -math.inf, -floor
+
+    if depth is None:
+        v = alpha_beta(board, alpha, beta)
     else:
-        for action in actions(board):
-            v = max_value(result(board, action))
-            #If an optimum value is found return the action immediately
-            if v == -1:
-                return action
-            my_list.append((v, action))
-
-        # From the list of value and actions find the action with min value
-        min_val = my_list[0][0]
-        for i in range(len(my_list)):
-            if my_list[i][0] <= min_val:
-                min_val = my_list[i][0]
-                index = i
-        return my_list[index][1]
+        v = depth_limited_value(board, depth - 1, alpha, beta,
+                                heuristic or line_heuristic, math.inf)
+    score = sign * v
+
+    if score > floor:
+        with shared_lock:
+            if (score, -index) > (shared_bounds[2 * slot],
+                                  -shared_bounds[2 * slot + 1]):
+                shared_bounds[2 * slot] = score
+                shared_bounds[2 * slot + 1] = index
+    return index, score, search_stats["nodes"]
 
 
 def max_value(board):
     """
     Returns the optimal value for the max player for the given board.
     """
+    search_stats["nodes"] += 1
     if terminal(board):
         return utility(board)
     v = (-1) * math.inf
@@ -159,6 +507,7 @@ def min_value(board):
     """
     Returns the optimal value for the min player for the given board.
     """
+    search_stats["nodes"] += 1
     if terminal(board):
         return utility(board)
     v = math.inf
@@ -167,6 +516,327 @@ def min_value(board):
     return v
 
 
+def alpha_beta(board, alpha, beta):
+    """
+    Returns the minimax value of the board, searching with alpha-beta
+    pruning. A value at or below alpha, or at or above beta, is only a
+    bound, since the rest of that branch cannot change the decision.
+    Every result is stored in the transposition table under the canonical
+    board, so later searches reaching the same position, or one of its
+    rotations or reflections, look it up instead.
+    """
+    search_stats["nodes"] += 1
+    key = canonical_key(board)
+    entry = transposition_table.get(key)
+    if entry is not None:
+        value, flag = entry
+        if (flag == EXACT or (flag == LOWER and value >= beta)
+                or (flag == UPPER and value <= alpha)):
+            search_stats["table_hits"] += 1
+            return value
+        if flag == LOWER:
+            alpha = max(alpha, value)
+        else:
+            beta = min(beta, value)
+
+    if terminal(board):
+        v = utility(board)
+        transposition_table[key] = (v, EXACT)
+        return v
+
+    alpha_orig = alpha
+    beta_orig = beta
+    if player(board) == X:
+        v = -math.inf
+        for action in ordered_actions(board):
+            v = max(v, alpha_beta(result(board, action), alpha, beta))
+            alpha = max(alpha, v)
+            if alpha >= beta:
+                break
+    else:
+        v = math.inf
+        for action in ordered_actions(board):
+            v = min(v, alpha_beta(result(board, action), alpha, beta))
+            beta = min(beta, v)
+            if alpha >= beta:
+                break
+
+    if v <= alpha_orig:
+        transposition_table[key] = (v, UPPER)
+    elif v >= beta_orig:
+        transposition_table[key] = (v, LOWER)
+    else:
+        transposition_table[key] = (v, EXACT)
+    return v
+
+
+def canonical_key(board):
+    """
+    Returns the shape of the board, (rows, columns, k), with the smallest
+    encoding of its cells over all its rotations and reflections, so that
+    symmetric positions share one table entry and positions of different
+    games never do.
+    """
+    rows, columns, k = board_shape(board)
+    if isinstance(board, Bitboard):
+        cells = board.cells()
+    else:
+        cells = tuple(CELL_CODE[cell] for row in board for cell in row)
+    return (rows, columns, k) + min(
+        tuple(cells[index] for index in permutation)
+        for permutation in symmetries(rows, columns))
+
+
+def ordered_actions(board):
+    """
+    Returns the possible actions sorted so that cells on the most winning
+    lines come first: on a 3 x 3 board the centre, then the corners, then
+    the edges.
+    """
+    priority = cell_priority(*board_shape(board))
+    return sorted(actions(board), key=lambda action: (priority[action], action))
+
+
+def iterative_deepening(board, time_limit=1.0, heuristic=None,
+                        max_depth=None, k=None):
+    """
+    Returns the best action found for the current player within
+    `time_limit` seconds, for boards too large for a full minimax search.
+
+    Runs depth-limited alpha-beta searches of depth 1, 2, ... and returns
+    the best action of the deepest search that finished in time. Positions
+    at the depth limit are scored by `heuristic`, a function of the board
+    returning a value strictly between -1 and 1 (by default
+    `line_heuristic`); won positions score at least 1 and lost positions
+    at most -1, more so the sooner they are reached. A list board is won
+    with `k` in a row if given, TOTAL_TO_WIN if not.
+    """
+    board = with_k(board, k)
+    if terminal(board):
+        return None
+
+    heuristic = heuristic or line_heuristic
+    deadline = time.perf_counter() + time_limit
+    moves = ordered_actions(board)
+    if max_depth is None:
+        max_depth = len(moves)
+
+    search_stats["nodes"] = 0
+    search_stats["depth"] = 0
+    best_action = moves[0]
+    for depth in range(1, max_depth + 1):
+        try:
+            action, value = depth_limited_root(board, moves, depth, heuristic,
+                                               deadline)
+        except SearchTimeout:
+            break
+        best_action = action
+        search_stats["depth"] = depth
+
+        # Search the best move of this depth first at the next depth
+        moves.remove(action)
+        moves.insert(0, action)
+
+        # Stop once the result is forced or the whole game was searched
+        if abs(value) >= 1 or depth >= len(moves):
+            break
+    return best_action
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside a depth-limited search when its time budget runs out.
+    """
+
+
+def depth_limited_root(board, moves, depth, heuristic, deadline):
+    """
+    Returns the best (action, value) pair for the current player from a
+    depth-limited alpha-beta search trying `moves` in order.
+    """
+    maximizing = player(board) == X
+    best_action = None
+    best_val = -math.inf if maximizing else math.inf
+    alpha = -math.inf
+    beta = math.inf
+    for action in moves:
+        v = depth_limited_value(result(board, action), depth - 1, alpha, beta,
+                                heuristic, deadline)
+        if maximizing and v > best_val:
+            best_val, best_action = v, action
+            alpha = max(alpha, v)
+        elif not maximizing and v < best_val:
+            best_val, best_action = v, action
+            beta = min(beta, v)
+    return best_action, best_val
+
+
+def depth_limited_value(board, depth, alpha, beta, heuristic, deadline):
+    """
+    Returns the value of the board from an alpha-beta search cut off after
+    `depth` more moves, raising SearchTimeout once `deadline` has passed.
+    """
+    search_stats["nodes"] += 1
+    if time.perf_counter() > deadline:
+        raise SearchTimeout()
+    if terminal(board):
+        return utility(board) * (1 + depth)
+    if depth == 0:
+        return heuristic(board)
+
+    if player(board) == X:
+        v = -math.inf
+        for action in ordered_actions(board):
+            v = max(v, depth_limited_value(result(board, action), depth - 1,
+                                           alpha, beta, heuristic, deadline))
+            alpha = max(alpha, v)
+            if alpha >= beta:
+                break
+        return v
+
+    v = math.inf
+    for action in ordered_actions(board):
+        v = min(v, depth_limited_value(result(board, action), depth - 1,
+                                       alpha, beta, heuristic, deadline))
+        beta = min(beta, v)
+        if alpha >= beta:
+            break
+    return v
+
+
+def line_heuristic(board):
+    """
+    Returns an estimate between -1 and 1 of how good the board is for X.
+    Every winning line still open to only one player counts towards that
+    player, more the more of its cells they hold.
+    """
+    rows, columns, k = board_shape(board)
+    masks = win_masks(rows, columns, k)
+    if not masks:
+        return 0
+    if isinstance(board, LineState):
+        score = board.line_score
+    else:
+        if not isinstance(board, Bitboard):
+            board = Bitboard.from_board(board, k)
+        score = sum(line_value(board.x & mask, board.o & mask)
+                    for mask in masks)
+    return 0.9 * score / (k * k * len(masks))
+
+
+def line_value(x_marks, o_marks):
+    """
+    Returns the square of the number of marks on a line still open to only
+    one player, positive for X and negative for O, given the marks of each
+    player on the line as bit masks.
+    """
+    x_count = bin(x_marks).count("1")
+    o_count = bin(o_marks).count("1")
+    if o_count == 0:
+        return x_count ** 2
+    if x_count == 0:
+        return -o_count ** 2
+    return 0
+
+
+def with_k(board, k):
+    """
+    Returns the board to search as a LineState, so that every move of the
+    search updates the winner and the line score instead of rescanning
+    the board. A list board is won with `k` in a row if given,
+    TOTAL_TO_WIN if not; a Bitboard keeps its own k.
+    """
+    if isinstance(board, LineState):
+        return board
+    if isinstance(board, Bitboard):
+        return LineState(board.x, board.o, board.rows, board.columns, board.k)
+    return LineState.from_board(board, k)
+
+
+def board_shape(board):
+    """
+    Returns the number of rows, columns and marks in a row needed to win.
+    """
+    if isinstance(board, Bitboard):
+        return board.rows, board.columns, board.k
+    return len(board), len(board[0]), TOTAL_TO_WIN
+
+
+def book_lookup(board):
+    """
+    Returns the (action, value) pair stored in the opening book for the
+    board, where action is None on a terminal board, or None if there is
+    no book for this board size or the board is not in it.
+    """
+    global opening_book
+    if board_shape(board) != (3, 3, 3):
+        return None
+    if opening_book is None:
+        opening_book = load_opening_book(BOOK_PATH)
+    if not opening_book:
+        return None
+
+    entry = opening_book[board_code(board)]
+    if entry == BOOK_MISSING:
+        return None
+    cell = entry & 0x0F
+    action = None if cell == NO_ACTION else divmod(cell, COLUMN)
+    return action, (entry >> 4) - 1
+
+
+def load_opening_book(path):
+    """
+    Returns the opening book at `path` mapped read-only into memory, or
+    False if it has not been built.
+    """
+    if not os.path.exists(path):
+        return False
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def build_opening_book(path=BOOK_PATH):
+    """
+    Solves every position reachable from the initial state and writes the
+    optimal action and value of each to the opening book at `path`.
+    Returns the number of positions solved.
+    """
+    book = bytearray([BOOK_MISSING]) * (3 ** (ROW * COLUMN))
+    frontier = [initial_state()]
+    solved = 0
+    while frontier:
+        board = frontier.pop()
+        code = board_code(board)
+        if book[code] != BOOK_MISSING:
+            continue
+
+        if terminal(board):
+            book[code] = (utility(board) + 1) << 4 | NO_ACTION
+        else:
+            i, j = search(board)
+            value = alpha_beta(board, -math.inf, math.inf)
+            book[code] = (value + 1) << 4 | (i * COLUMN + j)
+            frontier.extend(result(board, action) for action in actions(board))
+        solved += 1
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(book)
+    os.replace(temp_path, path)
+    return solved
+
+
+def board_code(board):
+    """
+    Returns the board as a base 3 number, one digit per cell in row order.
+    """
+    code = 0
+    for row in board:
+        for cell in row:
+            code = code * 3 + CELL_CODE[cell]
+    return code
+
+
 # Helper functions
 def check_winner_helper(x_count_list, o_count_list):
     """
@@ -189,9 +859,8 @@ def check_row_winner(board):
     :param board: the state of the game
     :return: X or O if there is a winner, otherwise return None
     """
-    x_count_list = [a.count(X) for a in board]
-    o_count_list = [a.count(O) for a in board]
-    return check_winner_helper(x_count_list, o_count_list)
+    lines = winning_lines(len(board), len(board[0]), TOTAL_TO_WIN)
+    return check_winner_helper(*line_counts(board, lines[(0, 1)]))
 
 
 def check_col_winner(board):
@@ -200,20 +869,135 @@ def check_col_winner(board):
     :param board: the state of the game
     :return: X or O if there is a winner, otherwise return None
     """
+    lines = winning_lines(len(board), len(board[0]), TOTAL_TO_WIN)
+    return check_winner_helper(*line_counts(board, lines[(1, 0)]))
+
+
+def line_counts(board, lines):
+    """
+    Helper function that counts the X and O marks on each line
+    :param board: the state of the game
+    :param lines: lines of cells from winning_lines
+    :return: list of X counts and list of O counts, one per line
+    """
     x_count_list = []
     o_count_list = []
-    for i in range(ROW):
-        x_count = 0
-        o_count = 0
-        for k in range(COLUMN):
-            if board[k][i] == X:
-                x_count += 1
-            if board[k][i] == O:
-                o_count += 1
-            if k == 2:
-                x_count_list.append(x_count)
-                o_count_list.append(o_count)
-    return check_winner_helper(x_count_list, o_count_list)
+    for line in lines:
+        cells = [board[i][j] for i, j in line]
+        x_count_list.append(cells.count(X))
+        o_count_list.append(cells.count(O))
+    return x_count_list, o_count_list
+
+
+@functools.lru_cache(maxsize=None)
+def winning_lines(rows, columns, k):
+    """
+    Helper function that lists every line of k cells on a rows x columns
+    board, grouped by direction
+    :param rows: number of rows
+    :param columns: number of columns
+    :param k: number in a row needed to win
+    :return: dictionary mapping each of DIRECTIONS to a tuple of lines,
+             each a tuple of (i, j) cells
+    """
+    lines = {}
+    for di, dj in DIRECTIONS:
+        found = []
+        for i in range(rows):
+            for j in range(columns):
+                end_i = i + di * (k - 1)
+                end_j = j + dj * (k - 1)
+                if 0 <= end_i < rows and 0 <= end_j < columns:
+                    found.append(tuple((i + di * step, j + dj * step)
+                                       for step in range(k)))
+        lines[(di, dj)] = tuple(found)
+    return lines
+
+
+@functools.lru_cache(maxsize=None)
+def cell_priority(rows, columns, k):
+    """
+    Helper function that ranks every cell by the number of winning lines
+    through it, for move ordering
+    :param rows: number of rows
+    :param columns: number of columns
+    :param k: number in a row needed to win
+    :return: dictionary mapping each (i, j) cell to minus its line count
+    """
+    priority = {(i, j): 0 for i in range(rows) for j in range(columns)}
+    for lines in winning_lines(rows, columns, k).values():
+        for line in lines:
+            for cell in line:
+                priority[cell] -= 1
+    return priority
+
+
+@functools.lru_cache(maxsize=None)
+def win_masks(rows, columns, k):
+    """
+    Helper function that lists the bit masks of every line of k cells on
+    a rows x columns Bitboard: rows, columns and both diagonal directions
+    :param rows: number of rows
+    :param columns: number of columns
+    :param k: number in a row needed to win
+    :return: tuple of bit masks
+    """
+    masks = []
+    for lines in winning_lines(rows, columns, k).values():
+        for line in lines:
+            mask = 0
+            for i, j in line:
+                mask |= 1 << (i * columns + j)
+            masks.append(mask)
+    return tuple(masks)
+
+
+@functools.lru_cache(maxsize=None)
+def cell_masks(rows, columns, k):
+    """
+    Helper function that lists, for every flattened cell index, the bit
+    masks of the winning lines through that cell
+    :param rows: number of rows
+    :param columns: number of columns
+    :param k: number in a row needed to win
+    :return: tuple of tuples of bit masks, one per cell
+    """
+    masks = [[] for _ in range(rows * columns)]
+    for mask in win_masks(rows, columns, k):
+        for cell in range(rows * columns):
+            if mask >> cell & 1:
+                masks[cell].append(mask)
+    return tuple(tuple(cell) for cell in masks)
+
+
+@functools.lru_cache(maxsize=None)
+def symmetries(rows, columns):
+    """
+    Helper function that lists the symmetries of a rows x columns board as
+    permutations of the flattened cell indices: all 8 rotations and
+    reflections of a square board, or the 4 flips of a rectangular one
+    :param rows: number of rows
+    :param columns: number of columns
+    :return: tuple of permutations, each a tuple of cell indices
+    """
+    def index(i, j):
+        return i * columns + j
+
+    cells = [(i, j) for i in range(rows) for j in range(columns)]
+    maps = [
+        lambda i, j: (i, j),
+        lambda i, j: (i, columns - 1 - j),
+        lambda i, j: (rows - 1 - i, j),
+        lambda i, j: (rows - 1 - i, columns - 1 - j),
+    ]
+    if rows == columns:
+        maps += [
+            lambda i, j: (j, i),
+            lambda i, j: (columns - 1 - j, i),
+            lambda i, j: (j, rows - 1 - i),
+            lambda i, j: (columns - 1 - j, rows - 1 - i),
+        ]
+    return tuple(tuple(index(*f(i, j)) for i, j in cells) for f in maps)
 
 
 def check_diagonal_winner(board):
@@ -222,37 +1006,6 @@ def check_diagonal_winner(board):
     :param board: the state of the game
     :return: X or O if there is a winner, otherwise return None
     """
-    x_count = 0
-    o_count = 0
-    game_winner = None
-
-    # check the top left to bottom right diagonal
-    for i in range(ROW):
-        for k in range(COLUMN):
-            if i == k:
-                if board[i][k] == X:
-                    x_count += 1
-                if board[i][k] == O:
-                    o_count += 1
-
-    if x_count == TOTAL_TO_WIN:
-        return X
-    elif o_count == TOTAL_TO_WIN:
-        return O
-
-    # check the bottom left to top right diagonal
-    l = [(0, 2), (1, 1), (2, 0)]
-    x_count = 0
-    o_count = 0
-    for i in range(ROW):
-        for k in range(COLUMN):
-            if (i, k) in l:
-                if board[i][k] == X:
-                    x_count += 1
-                if board[i][k] == O:
-                    o_count += 1
-    if x_count == TOTAL_TO_WIN:
-        return X
-    elif o_count == TOTAL_TO_WIN:
-        return O
-    return game_winner
+    lines = winning_lines(len(board), len(board[0]), TOTAL_TO_WIN)
+    diagonals = lines[(1, 1)] + lines[(1, -1)]
+    return check_winner_helper(*line_counts(board, diagonals))